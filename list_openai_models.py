@@ -2,12 +2,48 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import json
+import os
+import re
 import sys
-import urllib.error
-import urllib.request
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    # optional speedup; stdlib json is enough for this helper
+    orjson = None
+
+
+# Keep-alive pool: repeated fetch_models() calls (e.g. when imported from other scripts)
+# reuse the TLS connection instead of paying a full handshake each time.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+# KEY=VALUE | KEY="VALUE" | KEY='VALUE' (one line each); comment/blank lines never match.
+# `#` inside an unquoted value is kept as-is (passwords may contain it).
+_ENV_RE = re.compile(
+    rb"""^[ \t]*([^#\s=][^=\r\n]*?)[ \t]*=[ \t]*(?:"([^\r\n]*)"|'([^\r\n]*)'|([^\r\n]*?))[ \t]*\r?$""",
+    re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_dotenv(path: str, mtime_ns: int) -> dict[str, str]:
+    # Scan raw bytes (no decode of the whole file / per-line list); decode matched groups only.
+    data = Path(path).read_bytes()
+    env: dict[str, str] = {}
+    for m in _ENV_RE.finditer(data):
+        k, dq, sq, bare = m.groups()
+        v = dq if dq is not None else sq if sq is not None else bare
+        env[k.decode("utf-8")] = v.decode("utf-8")
+    return env
+
 
 def load_dotenv(dotenv_path: Path) -> dict[str, str]:
     """
@@ -15,64 +51,63 @@ def load_dotenv(dotenv_path: Path) -> dict[str, str]:
     - KEY=VALUE
     - ignores empty lines and comments (# ...)
     - supports quoted values: KEY="value" or KEY='value'
+    Parsed result is cached per (path, mtime); see clear_cache().
     """
-    if not dotenv_path.exists():
-        raise FileNotFoundError(f".env not found рядом со скриптом: {dotenv_path}")
+    try:
+        mtime_ns = os.stat(dotenv_path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f".env not found рядом со скриптом: {dotenv_path}") from None
+    return dict(_parse_dotenv(str(dotenv_path.resolve()), mtime_ns))
 
-    env: dict[str, str] = {}
-    for raw in dotenv_path.read_text(encoding="utf-8").splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#"):
-            continue
-        if "=" not in line:
-            continue
-        k, v = line.split("=", 1)
-        k = k.strip()
-        v = v.strip()
-        if not k:
-            continue
-        if (len(v) >= 2) and ((v[0] == v[-1] == '"') or (v[0] == v[-1] == "'")):
-            v = v[1:-1]
-        env[k] = v
-    return env
+
+def clear_cache() -> None:
+    _parse_dotenv.cache_clear()
 
 
-def fetch_models(api_key: str, base_url: str = "https://api.openai.com") -> list[str]:
+def fetch_models(
+    api_key: str,
+    base_url: str = "https://api.openai.com",
+    prefixes: tuple[str, ...] = (),
+) -> list[str]:
     url = base_url.rstrip("/") + "/v1/models"
-    req = urllib.request.Request(
-        url,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        method="GET",
-    )
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            payload = resp.read().decode("utf-8", errors="replace")
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="replace") if hasattr(e, "read") else ""
-        raise RuntimeError(f"HTTP {e.code} при запросе моделей: {body}".strip()) from e
-    except Exception as e:
+        resp = _SESSION.get(
+            url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=30,
+        )
+        resp.raise_for_status()
+        payload = resp.content
+    except requests.HTTPError as e:
+        # Error body is read from the pooled response; the connection stays reusable.
+        body = e.response.text[:3000] if e.response is not None else ""
+        code = e.response.status_code if e.response is not None else "?"
+        raise RuntimeError(f"HTTP {code} при запросе моделей: {body}".strip()) from e
+    except requests.RequestException as e:
         raise RuntimeError(f"Ошибка запроса моделей: {e}") from e
 
     try:
-        data = json.loads(payload)
+        data = orjson.loads(payload) if orjson is not None else json.loads(payload)
     except Exception as e:
-        raise RuntimeError(f"Не смог распарсить JSON ответа /v1/models: {e}\nRaw: {payload[:3000]}") from e
+        raw = payload[:3000].decode("utf-8", errors="replace")
+        raise RuntimeError(f"Не смог распарсить JSON ответа /v1/models: {e}\nRaw: {raw}") from e
 
-    items = data.get("data") or []
-    ids = []
-    for m in items:
-        mid = m.get("id")
-        if isinstance(mid, str) and mid:
-            ids.append(mid)
-    return sorted(set(ids))
+    items = data.get("data") or ()
+    # Filter while collecting (str.startswith(tuple) loops in C) so only matching ids are kept.
+    ids = {
+        mid
+        for m in items
+        if isinstance(mid := m.get("id"), str) and mid and (not prefixes or mid.startswith(prefixes))
+    }
+    return sorted(ids)
 
 
 def main() -> int:
     p = argparse.ArgumentParser(description="Print available OpenAI model ids (reads .env next to this script).")
-    p.add_argument("--prefix", default="", help="Filter model ids by prefix (e.g. gpt-).")
+    p.add_argument("--prefix", default="", help="Filter model ids by prefix, comma-separated (e.g. gpt-,o1).")
     p.add_argument("--json", action="store_true", help="Output as JSON array.")
     p.add_argument(
         "--base-url",
@@ -91,15 +126,13 @@ def main() -> int:
 
     base_url = (args.base_url or env.get("OPENAI_BASE_URL") or "https://api.openai.com").strip()
 
-    ids = fetch_models(api_key=api_key, base_url=base_url)
-    if args.prefix:
-        ids = [i for i in ids if i.startswith(args.prefix)]
+    prefixes = tuple(x.strip() for x in args.prefix.split(",") if x.strip())
+    ids = fetch_models(api_key=api_key, base_url=base_url, prefixes=prefixes)
 
     if args.json:
         print(json.dumps(ids, ensure_ascii=False, indent=2))
-    else:
-        for i in ids:
-            print(i)
+    elif ids:
+        sys.stdout.write("\n".join(ids) + "\n")
     return 0
 
 
@@ -2,28 +2,87 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import functools
+import os
+import re
 import sys
 from pathlib import Path
+from typing import Any
+
+
+# KEY=VALUE | KEY="VALUE" | KEY='VALUE' (one line each); comment/blank lines never match.
+# `#` inside an unquoted value is kept as-is (passwords may contain it).
+_ENV_RE = re.compile(
+    rb"""^[ \t]*([^#\s=][^=\r\n]*?)[ \t]*=[ \t]*(?:"([^\r\n]*)"|'([^\r\n]*)'|([^\r\n]*?))[ \t]*\r?$""",
+    re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_dotenv(path: str, mtime_ns: int) -> dict[str, str]:
+    """Parses .env once per (path, mtime); edits to the file invalidate the cache."""
+    # Scan raw bytes (no decode of the whole file / per-line list); decode matched groups only.
+    data = Path(path).read_bytes()
+    env: dict[str, str] = {}
+    for m in _ENV_RE.finditer(data):
+        k, dq, sq, bare = m.groups()
+        v = dq if dq is not None else sq if sq is not None else bare
+        env[k.decode("utf-8")] = v.decode("utf-8")
+    return env
 
 
 def _load_dotenv_near_script() -> dict[str, str]:
     """Minimal .env loader from the same directory as main.py."""
     env_path = Path(__file__).resolve().parent / ".env"
-    if not env_path.exists():
+    try:
+        mtime_ns = os.stat(env_path).st_mtime_ns
+    except FileNotFoundError:
         return {}
-    env: dict[str, str] = {}
-    for raw in env_path.read_text(encoding="utf-8").splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#") or "=" not in line:
-            continue
-        k, v = line.split("=", 1)
-        k = k.strip()
-        v = v.strip()
-        if (len(v) >= 2) and ((v[0] == v[-1] == '"') or (v[0] == v[-1] == "'")):
-            v = v[1:-1]
-        if k:
-            env[k] = v
-    return env
+    return dict(_parse_dotenv(str(env_path), mtime_ns))
+
+
+def clear_dotenv_cache() -> None:
+    _parse_dotenv.cache_clear()
+
+
+# Bot reused across get-updates calls (keeps the aiohttp connection to api.telegram.org alive).
+# Its session belongs to the loop that created it, so a call from another loop (e.g. a new
+# asyncio.run() per call in tests) gets a fresh Bot. Closed by _close_bot() (the CLI does that once,
+# before exiting) or on token change.
+_BOT: Any = None
+_BOT_TOKEN: str | None = None
+_BOT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+async def _get_bot(token: str) -> Any:
+    global _BOT, _BOT_TOKEN, _BOT_LOOP
+    loop = asyncio.get_running_loop()
+    if _BOT is not None and _BOT_TOKEN == token and _BOT_LOOP is loop:
+        return _BOT
+    await _close_bot()
+    # aiogram directly: this diagnostic command has no need to import soc_core (DB, models).
+    from aiogram import Bot
+
+    _BOT = Bot(token=token)
+    _BOT_TOKEN = token
+    _BOT_LOOP = loop
+    return _BOT
+
+
+async def _close_bot() -> None:
+    global _BOT, _BOT_TOKEN, _BOT_LOOP
+    if _BOT is None:
+        return
+    bot, same_loop = _BOT, _BOT_LOOP is asyncio.get_running_loop()
+    _BOT = None
+    _BOT_TOKEN = None
+    _BOT_LOOP = None
+    try:
+        await bot.session.close()
+    except Exception:
+        # session of an earlier (already closed) loop: nothing left to close from here
+        if same_loop:
+            raise
 
 
 async def cmd_get_updates() -> int:
@@ -32,22 +91,22 @@ async def cmd_get_updates() -> int:
     This command intentionally does NOT require IMAP settings.
     It reads TELEGRAM_BOT_TOKEN from .env next to main.py.
     """
-    from aiogram import Bot
-
     env = _load_dotenv_near_script()
     token = (env.get("TELEGRAM_BOT_TOKEN") or "").strip()
     if not token:
         print("ERROR: TELEGRAM_BOT_TOKEN is missing in .env (рядом с main.py).", file=sys.stderr)
         return 2
 
-    bot = Bot(token=token)
+    bot = await _get_bot(token)
     try:
         updates = await bot.get_updates(limit=50)
         if not updates:
-            print("No updates yet.")
-            print("1) Open your bot in Telegram and send any message (e.g. 'hi').")
-            print("2) Run: python main.py get-updates")
-            print("If you use webhook anywhere, disable it or use a clean bot token.")
+            sys.stdout.write(
+                "No updates yet.\n"
+                "1) Open your bot in Telegram and send any message (e.g. 'hi').\n"
+                "2) Run: python main.py get-updates\n"
+                "If you use webhook anywhere, disable it or use a clean bot token.\n"
+            )
             return 0
 
         printed = 0
@@ -63,14 +122,14 @@ async def cmd_get_updates() -> int:
         return 0
 
     except Exception as e:
-        print(f"ERROR: getUpdates failed: {e}", file=sys.stderr)
-        print("Common reasons:", file=sys.stderr)
-        print("- you didn't message the bot yet", file=sys.stderr)
-        print("- webhook is set (getUpdates cannot be used with webhook)", file=sys.stderr)
-        print("- invalid TELEGRAM_BOT_TOKEN", file=sys.stderr)
+        sys.stderr.write(
+            f"ERROR: getUpdates failed: {e}\n"
+            "Common reasons:\n"
+            "- you didn't message the bot yet\n"
+            "- webhook is set (getUpdates cannot be used with webhook)\n"
+            "- invalid TELEGRAM_BOT_TOKEN\n"
+        )
         return 1
-    finally:
-        await bot.session.close()
 
 
 async def cmd_imap_debug(sample: int) -> int:
@@ -88,23 +147,27 @@ async def cmd_imap_debug(sample: int) -> int:
     )
     info = await imap.debug_mailbox(from_email=s.imap_from_filter, sample=sample)
 
-    print("=== IMAP DEBUG ===")
-    print(f"host={info.get('host')} port={info.get('port')} mailbox={info.get('mailbox')}")
-    print(f"select_ok={info.get('selected_ok')} selected_count={info.get('selected_count')}")
+    host, port, mailbox = info.get("host"), info.get("port"), info.get("mailbox")
     counts = info.get("counts") or {}
-    print(
-        f"counts: ALL={counts.get('all')} UNSEEN={counts.get('unseen')} FROM_ALL={counts.get('from_all')} UNSEEN_FROM={counts.get('unseen_from')}"
-    )
-
-    print("\n--- Mailboxes (raw LIST output) ---")
-    for line in info.get("mailboxes") or []:
-        print(line)
-
-    print("\n--- Latest sample headers ---")
+    c_all, c_unseen = counts.get("all"), counts.get("unseen")
+    c_from_all, c_unseen_from = counts.get("from_all"), counts.get("unseen_from")
+    out: list[str] = [
+        "=== IMAP DEBUG ===",
+        f"host={host} port={port} mailbox={mailbox}",
+        f"select_ok={info.get('selected_ok')} selected_count={info.get('selected_count')}",
+        f"counts: ALL={c_all} UNSEEN={c_unseen} FROM_ALL={c_from_all} UNSEEN_FROM={c_unseen_from}",
+        "",
+        "--- Mailboxes (raw LIST output) ---",
+    ]
+    out.extend(info.get("mailboxes") or [])
+
+    out.append("")
+    out.append("--- Latest sample headers ---")
     for item in info.get("samples") or []:
-        print(f"\n[UID {item.get('uid')}] {item.get('flags_line')}")
-        print(item.get("header") or "")
+        out.append(f"\n[UID {item.get('uid')}] {item.get('flags_line')}")
+        out.append(item.get("header") or "")
 
+    sys.stdout.write("\n".join(out) + "\n")
     return 0
 
 
@@ -123,58 +186,81 @@ def cmd_reset_db(yes: bool) -> int:
         print("Re-run with: python main.py reset-db --yes")
         return 2
 
-    if db_path.exists():
+    # Single unlink() instead of exists()+unlink(): no extra stat and no TOCTOU window.
+    try:
         db_path.unlink()
-        print(f"OK: deleted {db_path}")
-    else:
+    except FileNotFoundError:
         print(f"OK: database file not found (already clean): {db_path}")
+    else:
+        print(f"OK: deleted {db_path}")
+    return 0
+
+
+def _handle_run(args: argparse.Namespace) -> int:
+    from soc_core.app import run
+    from soc_core.config import load_settings
+
+    asyncio.run(run(load_settings()))
     return 0
 
 
+def _handle_run_once(args: argparse.Namespace) -> int:
+    from soc_core.app import run_once
+    from soc_core.config import load_settings
+
+    asyncio.run(run_once(load_settings(), mode=args.mode, limit=args.limit))
+    return 0
+
+
+def _handle_get_updates(args: argparse.Namespace) -> int:
+    async def _main() -> int:
+        try:
+            return await cmd_get_updates()
+        finally:
+            await _close_bot()
+
+    return asyncio.run(_main())
+
+
+def _handle_imap_debug(args: argparse.Namespace) -> int:
+    return asyncio.run(cmd_imap_debug(sample=args.sample))
+
+
+def _handle_reset_db(args: argparse.Namespace) -> int:
+    return cmd_reset_db(yes=args.yes)
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="socana")
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("run", help="Run SOCANA (IMAP polling + Telegram bot)")
-    sub.add_parser("run-once", help="Process Kaspersky emails once (UNSEEN by default, can use --mode latest for tests)")
-    # args for run-once
-    ro = sub.choices["run-once"]
+    p_run = sub.add_parser("run", help="Run SOCANA (IMAP polling + Telegram bot)")
+    p_run.set_defaults(handler=_handle_run)
+
+    ro = sub.add_parser("run-once", help="Process Kaspersky emails once (UNSEEN by default, can use --mode latest for tests)")
     ro.add_argument("--mode", choices=["unseen", "latest"], default="unseen", help="unseen=only UNSEEN mails; latest=last N mails regardless of Seen")
     ro.add_argument("--limit", type=int, default=25, help="How many emails to fetch (default: 25)")
-    sub.add_parser("get-updates", help="Print Telegram chat_id from recent bot updates")
+    ro.set_defaults(handler=_handle_run_once)
+
+    p_upd = sub.add_parser("get-updates", help="Print Telegram chat_id from recent bot updates")
+    p_upd.set_defaults(handler=_handle_get_updates)
 
     p_imap = sub.add_parser("imap-debug", help="Debug IMAP: counts and sample headers")
     p_imap.add_argument("--sample", type=int, default=10, help="How many latest messages to sample (default: 10)")
+    p_imap.set_defaults(handler=_handle_imap_debug)
 
     p_reset = sub.add_parser("reset-db", help="Delete SQLite DB (SQLITE_PATH) to reset SOCANA state")
     p_reset.add_argument("--yes", action="store_true", help="Confirm deletion (required)")
+    p_reset.set_defaults(handler=_handle_reset_db)
 
     return p
 
 
 def main() -> None:
     args = build_parser().parse_args()
-
-    if args.cmd == "get-updates":
-        raise SystemExit(asyncio.run(cmd_get_updates()))
-
-    if args.cmd == "imap-debug":
-        raise SystemExit(asyncio.run(cmd_imap_debug(sample=args.sample)))
-
-    if args.cmd == "reset-db":
-        raise SystemExit(cmd_reset_db(yes=getattr(args, "yes", False)))
-
-    from soc_core.app import run, run_once
-    from soc_core.config import load_settings
-
-    settings = load_settings()
-
-    if args.cmd == "run":
-        asyncio.run(run(settings))
-    elif args.cmd == "run-once":
-        asyncio.run(run_once(settings, mode=getattr(args, "mode", "unseen"), limit=getattr(args, "limit", 25)))
-    else:
-        raise SystemExit(2)
+    # Each handler lazy-imports only what its subcommand needs.
+    rc = args.handler(args)
+    raise SystemExit(rc if rc is not None else 0)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,118 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import os
+import threading
+from typing import Any
 
 from soc_core.models import EnrichedEvent, KasperskyEvent
 from soc_core.prompts import Prompts, default_prompts
 
+# CrewAI classes (Agent, Crew, Task), imported on first LLM call and reused afterwards.
+_CREW: tuple[Any, Any, Any] | None = None
+# (llm_model, prompts) -> idle (analyst, researcher, dispatcher) sets. Agents don't depend on event
+# data, so they (and their LLM clients) are reused across events; Prompts is a frozen, hashable
+# dataclass. A set is checked out for the duration of one kickoff: CrewAI mutates agent state
+# while running, so alerts processed concurrently must not share one.
+_AGENT_CACHE: dict[tuple[str, Prompts], list[tuple[Any, Any, Any]]] = {}
+_AGENT_CACHE_MAX = 8
+_AGENT_POOL_MAX = 8
+# crew.kickoff() runs in a worker thread and cannot be cancelled: when the caller gives up
+# (per-attempt timeout in tasks.build_dispatch_message), the thread keeps running its LLM calls to the end.
+# At most this many kickoffs run at once, so timed-out crews cannot pile up in the background.
+_KICKOFF_MAX_RUNNING = 8
+_kickoff_slots = threading.BoundedSemaphore(_KICKOFF_MAX_RUNNING)
+# Last key exported to os.environ (process-global side effect, done only on change).
+_LAST_KEY: str | None = None
+
+_CTX_TMPL = (
+    "Event:\n"
+    "- vendor_severity: {}\n"
+    "- device: {}\n"
+    "- event_type: {}\n"
+    "- detection_name: {}\n"
+    "- object_path: {}\n"
+    "- process_name: {}\n"
+    "- sha256: {}\n"
+    "- user: {}\n"
+    "- result: {}\n"
+    "- event_time_utc: {}\n"
+    "\n"
+    "Context:\n"
+    "- asset_type: {}\n"
+    "- rules_risk_level: {}\n"
+    "- rules_reason: {}\n"
+    "- repeats_counter: {}\n"
+    "- known_servers: {}"
+)
+
+
+def _crewai() -> tuple[Any, Any, Any]:
+    global _CREW
+    if _CREW is None:
+        from crewai import Agent, Crew, Task
+
+        _CREW = (Agent, Crew, Task)
+    return _CREW
+
+
+@functools.lru_cache(maxsize=32)
+def _normalize_llm(model: str) -> str:
+    # LiteLLM generally expects provider prefix; keep as-is if already provided.
+    return model if (not model or "/" in model) else f"openai/{model}"
+
+
+def _acquire_agents(Agent: Any, llm_model: str, p: Prompts) -> tuple[Any, Any, Any]:
+    idle = _AGENT_CACHE.get((llm_model, p))
+    if idle:
+        return idle.pop()
+    return tuple(
+        Agent(
+            role=ap.role,
+            goal=ap.goal,
+            backstory=ap.backstory,
+            allow_delegation=False,
+            verbose=False,
+            llm=llm_model,
+        )
+        for ap in (p.analyst, p.researcher, p.dispatcher)
+    )
+
+
+def _release_agents(llm_model: str, p: Prompts, agents: tuple[Any, Any, Any]) -> None:
+    key = (llm_model, p)
+    idle = _AGENT_CACHE.get(key)
+    if idle is None:
+        if len(_AGENT_CACHE) >= _AGENT_CACHE_MAX:
+            # prompts.yaml edited many times in one process; drop stale entries
+            _AGENT_CACHE.clear()
+        idle = _AGENT_CACHE[key] = []
+    if len(idle) < _AGENT_POOL_MAX:
+        idle.append(agents)
+
+
+class CrewBusyError(RuntimeError):
+    """All kickoff slots are taken (typically by crews still running after their caller timed out)."""
+
+
+def _bounded_kickoff(crew: Any) -> Any:
+    # Slot is taken inside the worker thread, so it is released exactly when kickoff really ends.
+    if not _kickoff_slots.acquire(blocking=False):
+        raise CrewBusyError(f"{_KICKOFF_MAX_RUNNING} CrewAI kickoffs still running")
+    try:
+        return crew.kickoff()
+    finally:
+        _kickoff_slots.release()
+
+
+def clear_cache() -> None:
+    global _CREW, _LAST_KEY
+    _CREW = None
+    _LAST_KEY = None
+    _AGENT_CACHE.clear()
+    _normalize_llm.cache_clear()
+
 
 async def run_crewai_analysis(
     *,
@@ -22,79 +130,76 @@ async def run_crewai_analysis(
     вся система работала на rules-first.
     """
     try:
-        from crewai import Agent, Crew, Task
+        Agent, Crew, Task = _crewai()
     except Exception as e:
         # crewai не обязателен для rules-first режима
         raise RuntimeError("CrewAI is not available") from e
 
     # Ensure provider SDK is configured for CrewAI/LiteLLM
-    if openai_api_key:
+    global _LAST_KEY
+    if openai_api_key and openai_api_key != _LAST_KEY:
         os.environ["OPENAI_API_KEY"] = openai_api_key
+        _LAST_KEY = openai_api_key
 
     servers_ctx = ", ".join(servers) if servers else "(none)"
     p = prompts or default_prompts()
 
-    # LiteLLM generally expects provider prefix; keep as-is if already provided.
-    llm_model = model
-    if llm_model and "/" not in llm_model:
-        llm_model = f"openai/{llm_model}"
-
-    analyst = Agent(
-        role=p.analyst.role,
-        goal=p.analyst.goal,
-        backstory=p.analyst.backstory,
-        allow_delegation=False,
-        verbose=False,
-        llm=llm_model,
-    )
-
-    researcher = Agent(
-        role=p.researcher.role,
-        goal=p.researcher.goal,
-        backstory=p.researcher.backstory,
-        allow_delegation=False,
-        verbose=False,
-        llm=llm_model,
-    )
-
-    dispatcher = Agent(
-        role=p.dispatcher.role,
-        goal=p.dispatcher.goal,
-        backstory=p.dispatcher.backstory,
-        allow_delegation=False,
-        verbose=False,
-        llm=llm_model,
+    llm_model = _normalize_llm(model)
+
+    agents = _acquire_agents(Agent, llm_model, p)
+    analyst, researcher, dispatcher = agents
+
+    base_ctx = _CTX_TMPL.format(
+        event.vendor_severity,
+        event.device,
+        event.event_type,
+        event.detection_name,
+        event.object_path,
+        event.process_name,
+        event.sha256,
+        event.user,
+        event.result,
+        event.event_time,
+        enriched.asset_type,
+        enriched.risk_level,
+        enriched.risk_reason,
+        repeats,
+        servers_ctx,
     )
 
-    base_ctx = f"""
-Event:
-- vendor_severity: {event.vendor_severity}
-- device: {event.device}
-- event_type: {event.event_type}
-- detection_name: {event.detection_name}
-- object_path: {event.object_path}
-- process_name: {event.process_name}
-- sha256: {event.sha256}
-- user: {event.user}
-- result: {event.result}
-- event_time_utc: {event.event_time}
-
-Context:
-- asset_type: {enriched.asset_type}
-- rules_risk_level: {enriched.risk_level}
-- rules_reason: {enriched.risk_reason}
-- repeats_counter: {repeats}
-- known_servers: {servers_ctx}
-""".strip()
-
     if extra_context:
         base_ctx = base_ctx + "\n\nExtra context:\n" + extra_context.strip()
-
-    t1 = Task(description=base_ctx + "\n\n" + p.tasks.soc_analysis_suffix, expected_output=p.tasks.expected_output_analyst, agent=analyst)
-    t2 = Task(description=base_ctx + "\n\n" + p.tasks.threat_research_suffix, expected_output=p.tasks.expected_output_researcher, agent=researcher)
-    t3 = Task(description=base_ctx + "\n\n" + p.tasks.telegram_report_suffix, expected_output=p.tasks.expected_output_dispatcher, agent=dispatcher)
+    ctx_head = base_ctx + "\n\n"
+
+    # Analyst and researcher only need base_ctx, so they run concurrently (async_execution);
+    # the dispatcher composes the final report and waits for both via context.
+    t1 = Task(
+        description=ctx_head + p.tasks.soc_analysis_suffix,
+        expected_output=p.tasks.expected_output_analyst,
+        agent=analyst,
+        async_execution=True,
+    )
+    t2 = Task(
+        description=ctx_head + p.tasks.threat_research_suffix,
+        expected_output=p.tasks.expected_output_researcher,
+        agent=researcher,
+        async_execution=True,
+    )
+    t3 = Task(
+        description=ctx_head + p.tasks.telegram_report_suffix,
+        expected_output=p.tasks.expected_output_dispatcher,
+        agent=dispatcher,
+        context=[t1, t2],
+    )
 
     crew = Crew(agents=[analyst, researcher, dispatcher], tasks=[t1, t2, t3], verbose=False)
-    result = crew.kickoff()
+    # kickoff() is blocking (LLM HTTP calls); keep the event loop (Telegram polling) responsive.
+    try:
+        result = await asyncio.to_thread(_bounded_kickoff, crew)
+    except CrewBusyError:
+        # kickoff never started, so the agent set is untouched and can go back to the pool
+        _release_agents(llm_model, p, agents)
+        raise
+    # Only a cleanly finished set goes back to the pool; after a failure it is simply dropped.
+    _release_agents(llm_model, p, agents)
     return str(result)
-
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
 from datetime import UTC, datetime, timedelta
+from typing import Any, Awaitable, Callable, Sequence
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 from aiogram import Bot
 
 from soc_core.agents import run_crewai_analysis
-from soc_core.bot import build_bot, send_dispatch
+from soc_core.bot import build_bot, make_bot, send_dispatch
 from soc_core.config import Settings
 from soc_core.database import Database
 from soc_core.imap_client import ImapClient
+from soc_core.models import RiskLevel
 from soc_core.parser import KasperskyEmailParser
 from soc_core.prompts import load_prompts
 from soc_core.tools import WebTools
@@ -21,9 +24,24 @@ from soc_core.tasks import build_dispatch_message
 logger = logging.getLogger("socana")
 
 _RISK_RANK = {"INFO": 0, "LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
+_RISK_RANK_BY_ENUM: dict[RiskLevel, int] = {lvl: _RISK_RANK[lvl.value] for lvl in RiskLevel}
+
+# Max parallel Telegram sends per fan-out (stay well under Bot API rate limits).
+_SEND_CONCURRENCY = 8
+
+
+@functools.lru_cache(maxsize=32)
+def _min_rank(min_risk: str | None) -> int:
+    """Rank of a recipient's min_risk setting (few distinct values, so memoized)."""
+    return _RISK_RANK.get((min_risk or "MEDIUM").strip().upper(), 2)
 
 
 def _dedup_ints(xs: list[int]) -> list[int]:
+    try:
+        # Fast path (all items int-convertible): ordered dedup in C.
+        return list(dict.fromkeys(map(int, xs)))
+    except (TypeError, ValueError):
+        pass
     out: list[int] = []
     seen: set[int] = set()
     for x in xs:
@@ -38,22 +56,82 @@ def _dedup_ints(xs: list[int]) -> list[int]:
     return out
 
 
+def _collect_admin_chats(settings: Settings) -> tuple[tuple[int, ...], frozenset[int]]:
+    """TELEGRAM_CHAT_ID + TELEGRAM_ADMIN_CHAT_IDS, deduped (ordered tuple + set for membership checks)."""
+    raw: list[int] = []
+    if settings.telegram_chat_id:
+        raw.append(settings.telegram_chat_id)
+    raw.extend(settings.telegram_admin_chat_ids or [])
+    admin_chats = tuple(_dedup_ints(raw))
+    return admin_chats, frozenset(admin_chats)
+
+
+def _active_owners(
+    recipients: list[tuple[int, int, str, bool]], admin_chats_set: frozenset[int]
+) -> list[tuple[int, int]]:
+    """(chat_id, min_rank) of enabled host owners that are not admin chats (admins get every alert anyway)."""
+    return [
+        (int(chat_id), _min_rank(min_risk))
+        for chat_id, _user_id, min_risk, enabled in recipients
+        if enabled and int(chat_id) not in admin_chats_set
+    ]
+
+
+async def _fan_out(chat_ids: Sequence[int], send_one: Callable[[int], Awaitable[Any]]) -> list[Any]:
+    """
+    Runs send_one(chat_id) for all chats concurrently (bounded by _SEND_CONCURRENCY).
+    Returns results in chat_ids order; failures are returned as exception objects.
+    """
+    sem = asyncio.Semaphore(_SEND_CONCURRENCY)
+
+    async def _one(chat_id: int) -> Any:
+        async with sem:
+            return await send_one(chat_id)
+
+    return await asyncio.gather(*(_one(c) for c in chat_ids), return_exceptions=True)
+
+
+def _make_imap(settings: Settings) -> ImapClient:
+    return ImapClient(
+        host=settings.imap_host,
+        port=settings.imap_port,
+        username=settings.imap_username,
+        password=settings.imap_password,
+        mailbox=settings.imap_mailbox,
+    )
+
+
 @retry(stop=stop_after_attempt(5), wait=wait_exponential(min=1, max=30), reraise=True)
 async def _poll_once(
     settings: Settings,
     db: Database,
     *,
     bot: Bot | None = None,
+    web: WebTools | None = None,
+    imap: ImapClient | None = None,
     mode: str = "unseen",
     limit: int = 25,
 ) -> int:
-    imap = ImapClient(
-        host=settings.imap_host,
-        port=settings.imap_port,
-        username=settings.imap_username,
-        password=settings.imap_password,
-        mailbox=settings.imap_mailbox,
-    )
+    # Pass a long-lived `imap` to keep its logged-in connection between polls.
+    if imap is not None:
+        return await _poll_mailbox(settings, db, imap, bot=bot, web=web, mode=mode, limit=limit)
+    imap = _make_imap(settings)
+    try:
+        return await _poll_mailbox(settings, db, imap, bot=bot, web=web, mode=mode, limit=limit)
+    finally:
+        await imap.close()
+
+
+async def _poll_mailbox(
+    settings: Settings,
+    db: Database,
+    imap: ImapClient,
+    *,
+    bot: Bot | None,
+    web: WebTools | None,
+    mode: str,
+    limit: int,
+) -> int:
     parser = KasperskyEmailParser()
     logger.info(
         "IMAP poll: host=%s mailbox=%s from=%s",
@@ -69,9 +147,28 @@ async def _poll_once(
     if not msgs:
         return 0
 
-    uids_to_mark_seen: list[str] = []
-    processed = 0
-    for m in msgs:
+    # Invariant for the whole poll.
+    admin_chats, admin_chats_set = _collect_admin_chats(settings)
+    prompts = load_prompts(settings.prompts_path)
+    if web is None:
+        web = WebTools(settings.serper_api_key, settings.tavily_api_key)
+
+    # Caller didn't pass a bot (run_once without TELEGRAM_CHAT_ID): one Bot for the whole poll.
+    send_bot = bot
+    owns_bot = False
+    if send_bot is None and admin_chats:
+        send_bot = make_bot(settings.telegram_bot_token)
+        owns_bot = True
+
+    uids_to_mark_seen: set[str] = set()
+    # Messages overlap on LLM/web/Telegram latency. Ingest + the anti-spam decision stay
+    # serialized: two concurrent should_send_alert() calls for one fingerprint would both send.
+    sem = asyncio.Semaphore(settings.max_concurrent_alerts)
+    ingest_lock = asyncio.Lock()
+
+    async def _process_one(m: Any) -> bool:
+        # One timestamp per message: dedup, correlation window and telegram_messages rows.
+        now = datetime.now(tz=UTC)
         parsed = parser.parse(uid=m.uid, raw_email=m.raw)
         logger.debug(
             "Parsed email uid=%s device=%s event_type=%s detection=%s sha256=%s",
@@ -81,70 +178,89 @@ async def _poll_once(
             parsed.event.detection_name,
             parsed.event.sha256,
         )
-        email_id, created = await db.upsert_email(
-            uid=parsed.uid,
-            raw_text=parsed.raw_text,
-            message_id=parsed.message_id,
-            subject=parsed.subject,
-            from_email=parsed.from_email,
-            date_utc=parsed.date,
-        )
+        async with ingest_lock:
+            email_id, created = await db.upsert_email(
+                uid=parsed.uid,
+                raw_text=parsed.raw_text,
+                message_id=parsed.message_id,
+                subject=parsed.subject,
+                from_email=parsed.from_email,
+                date_utc=parsed.date,
+            )
+            if created:
+                # Auto-add host to assets DB on first seen event.
+                # New hosts start as UNCLASSIFIED and should be classified later via Telegram bot (/assets).
+                try:
+                    await db.ensure_asset(parsed.event.device)
+                except Exception:
+                    # Best-effort: do not break ingest if assets write fails.
+                    pass
+
+                await db.insert_event(email_id=email_id, ev=parsed.event)
+
+                fp = parsed.event.fingerprint()
+                send, repeats = await db.should_send_alert(
+                    fingerprint=fp,
+                    now_utc=now,
+                    window_seconds=settings.anti_spam_window_seconds,
+                    repeat_threshold=settings.anti_spam_repeat_threshold,
+                    email_id=email_id,
+                )
         if not created:
             # Already ingested this UID before.
             # We still may want to deliver it to *newly bound* host owners (replay),
             # without re-running parsing/AI.
             if settings.imap_mark_seen:
-                uids_to_mark_seen.append(parsed.uid)
+                uids_to_mark_seen.add(parsed.uid)
             # Replay to owners if:
             # - we have a stored telegram message for this email_id (already sent to admin earlier)
             # - the owner hasn't received it yet (no telegram_messages row for that chat_id)
-            admin_chats = []
-            if settings.telegram_chat_id:
-                admin_chats.append(settings.telegram_chat_id)
-            admin_chats.extend(settings.telegram_admin_chat_ids or [])
-            admin_chats = _dedup_ints(admin_chats)
             if not admin_chats:
-                continue
+                return False
+            # Cheap filters first: most hosts have no bound owners, so skip the history lookups.
+            try:
+                recipients = await db.list_recipients_for_device(device=parsed.event.device)
+            except Exception:
+                recipients = []
+            owners = _active_owners(recipients, admin_chats_set)
+            if not owners:
+                return False
             try:
                 stored = await db.get_latest_telegram_message_for_email(email_id)
             except Exception:
                 stored = None
             if not stored:
-                continue
+                return False
             stored_text, stored_risk = stored
             msg_rank = _RISK_RANK.get((stored_risk or "").upper(), 0)
+            candidates = [c for c, rank in owners if msg_rank >= rank]
+            if not candidates:
+                return False
             try:
-                recipients = await db.list_recipients_for_device(device=parsed.event.device)
+                already_sent = await db.existing_telegram_chats(email_id=email_id, chat_ids=candidates)
             except Exception:
-                recipients = []
-            send_bot = bot
-            close_after = False
-            if send_bot is None:
-                send_bot = Bot(token=settings.telegram_bot_token)
-                close_after = True
-            for r_chat_id, _r_user_id, min_risk, enabled in recipients:
-                if not enabled:
-                    continue
-                if int(r_chat_id) in set(admin_chats):
-                    continue
-                mr = (min_risk or "MEDIUM").strip().upper()
-                if msg_rank < _RISK_RANK.get(mr, 2):
+                logger.exception("Replay to owners skipped (history lookup failed): email_id=%s", email_id)
+                candidates = []
+                already_sent = set()
+            to_send = [c for c in candidates if c not in already_sent]
+            # Send stored text as-is (HTML). No "Details" button for owners (safe).
+            results = await _fan_out(
+                to_send,
+                lambda cid: send_bot.send_message(chat_id=cid, text=stored_text, parse_mode="HTML"),
+            )
+            for r_chat_id, sent in zip(to_send, results):
+                if isinstance(sent, BaseException):
+                    logger.error(
+                        "Replay to owner failed: email_id=%s chat_id=%s", email_id, r_chat_id, exc_info=sent
+                    )
                     continue
                 try:
-                    if await db.has_telegram_message(email_id=email_id, chat_id=int(r_chat_id)):
-                        continue
-                    # Send stored text as-is (HTML). No "Details" button for owners (safe).
-                    sent = await send_bot.send_message(
-                        chat_id=int(r_chat_id),
-                        text=stored_text,
-                        parse_mode="HTML",
-                    )
                     await db.add_telegram_message(
                         email_id=email_id,
                         device=parsed.event.device,
-                        chat_id=int(r_chat_id),
+                        chat_id=r_chat_id,
                         telegram_message_id=sent.message_id,
-                        sent_at_utc=datetime.now(tz=UTC),
+                        sent_at_utc=now,
                         risk_level=stored_risk,
                         ai_enabled=settings.enable_llm,
                         model_used=settings.openai_model if settings.enable_llm else None,
@@ -153,32 +269,8 @@ async def _poll_once(
                     )
                 except Exception:
                     logger.exception("Replay to owner failed: email_id=%s chat_id=%s", email_id, r_chat_id)
-            if close_after:
-                try:
-                    await send_bot.session.close()
-                except Exception:
-                    pass
-            continue
-
-        # Auto-add host to assets DB on first seen event.
-        # New hosts start as UNCLASSIFIED and should be classified later via Telegram bot (/assets).
-        try:
-            await db.ensure_asset(parsed.event.device)
-        except Exception:
-            # Best-effort: do not break ingest if assets write fails.
-            pass
+            return False
 
-        await db.insert_event(email_id=email_id, ev=parsed.event)
-
-        now = datetime.now(tz=UTC)
-        fp = parsed.event.fingerprint()
-        send, repeats = await db.should_send_alert(
-            fingerprint=fp,
-            now_utc=now,
-            window_seconds=settings.anti_spam_window_seconds,
-            repeat_threshold=settings.anti_spam_repeat_threshold,
-            email_id=email_id,
-        )
         logger.info(
             "Dedup: uid=%s send=%s repeats=%s fingerprint=%s",
             parsed.uid,
@@ -188,11 +280,8 @@ async def _poll_once(
         )
         if not send:
             if settings.imap_mark_seen:
-                uids_to_mark_seen.append(parsed.uid)
-            continue
-
-        prompts = load_prompts(settings.prompts_path)
-        web = WebTools(settings.serper_api_key, settings.tavily_api_key)
+                uids_to_mark_seen.add(parsed.uid)
+            return False
 
         async def llm_runner(event, enriched, servers, repeats):
             # Build extra context: web search + simple correlation hints.
@@ -200,11 +289,14 @@ async def _poll_once(
             sources: list[str] = []
 
             # Correlation hint: same detection on multiple devices recently.
-            since = datetime.now(tz=UTC) - timedelta(hours=2)
+            since = now - timedelta(hours=2)
 
             try:
-                devices = await db.recent_devices_for_detection(detection_name=event.detection_name, since_utc=since)
-                devices = [d for d in devices if d and d != (event.device or "")]
+                devices = await db.recent_devices_for_detection(
+                    detection_name=event.detection_name, since_utc=since
+                )
+                own = event.device or ""
+                devices = [d for d in dict.fromkeys(devices) if d and d != own]
                 if devices:
                     extra.append(
                         "Correlation hint: same detection_name seen on other devices recently: "
@@ -233,29 +325,27 @@ async def _poll_once(
                         lines.append(f"- {title} | {link} | {snippet}".strip())
                     return "\n".join(lines)
 
+                # (query, provider, title_key, link_key, snippet_key) per search call; results keep query order.
+                calls: list[tuple[str, str, str, str, str]] = []
+                coros = []
                 for q in queries[:3]:
-                    try:
-                        serp = web.serper_search(q, num=5)
-                        if serp:
-                            extra.append("Serper results for: " + q + "\n" + _fmt_hits("title", "link", "snippet", serp))
-                            for h in serp[:3]:
-                                link = (h.get("link") or "").strip()
-                                title = (h.get("title") or "").strip()
-                                if link:
-                                    sources.append(f"- {title} | {link}")
-                    except Exception:
-                        pass
-                    try:
-                        tav = web.tavily_search(q, max_results=5)
-                        if tav:
-                            extra.append("Tavily results for: " + q + "\n" + _fmt_hits("title", "url", "content", tav))
-                            for h in tav[:3]:
-                                link = (h.get("url") or "").strip()
-                                title = (h.get("title") or "").strip()
-                                if link:
-                                    sources.append(f"- {title} | {link}")
-                    except Exception:
-                        pass
+                    calls.append((q, "Serper", "title", "link", "snippet"))
+                    coros.append(asyncio.to_thread(web.serper_search, q, 5))
+                    calls.append((q, "Tavily", "title", "url", "content"))
+                    coros.append(asyncio.to_thread(web.tavily_search, q, 5))
+                # Up to 6 blocking HTTP calls overlap instead of running back-to-back.
+                results = await asyncio.gather(*coros, return_exceptions=True)
+                for (q, provider, title_key, link_key, snippet_key), hits in zip(calls, results):
+                    if isinstance(hits, BaseException) or not hits:
+                        continue
+                    extra.append(
+                        f"{provider} results for: " + q + "\n" + _fmt_hits(title_key, link_key, snippet_key, hits)
+                    )
+                    for h in hits[:3]:
+                        link = (h.get(link_key) or "").strip()
+                        title = (h.get(title_key) or "").strip()
+                        if link:
+                            sources.append(f"- {title} | {link}")
 
             ai_text = await run_crewai_analysis(
                 event=event,
@@ -265,7 +355,7 @@ async def _poll_once(
                 model=settings.openai_model,
                 prompts=prompts,
                 openai_api_key=settings.openai_api_key,
-                extra_context="\n\n".join(extra) if extra else None,
+                extra_context="\n\n".join(extra) or None,
             )
             # Make AI enrichment visible even if the model output is terse.
             header = f"AI: CrewAI enabled | model={settings.openai_model}"
@@ -282,32 +372,25 @@ async def _poll_once(
             llm_runner=llm_runner if settings.enable_llm else None,
         )
 
-        admin_chats = []
-        if settings.telegram_chat_id:
-            admin_chats.append(settings.telegram_chat_id)
-        admin_chats.extend(settings.telegram_admin_chat_ids or [])
-        admin_chats = _dedup_ints(admin_chats)
-
         if admin_chats:
-            send_bot = bot
-            close_after = False
-            if send_bot is None:
-                send_bot = Bot(token=settings.telegram_bot_token)
-                close_after = True
             try:
-                llm_fallback = None
-                if "LLM fallback:" in dispatch.text:
-                    # keep short token, e.g. "APIConnectionError"
-                    llm_fallback = dispatch.text.split("LLM fallback:", 1)[1].strip().splitlines()[0][:128]
+                llm_fallback = dispatch.llm_fallback
 
-                # 1) Always send to admins (fan-out)
+                # 1) Always send to admins (fan-out); DB rows are written after the sends complete.
                 admin_sent_any = False
-                for ac in admin_chats:
-                    try:
-                        sent_text, tg_message_id = await send_dispatch(
-                            send_bot, ac, dispatch, include_details_button=True
+                results = await _fan_out(
+                    admin_chats,
+                    lambda cid: send_dispatch(send_bot, cid, dispatch, include_details_button=True),
+                )
+                for ac, res in zip(admin_chats, results):
+                    if isinstance(res, BaseException):
+                        logger.error(
+                            "Telegram send failed to admin chat_id=%s for email_id=%s", ac, email_id, exc_info=res
                         )
-                        admin_sent_any = True
+                        continue
+                    sent_text, tg_message_id = res
+                    admin_sent_any = True
+                    try:
                         await db.add_telegram_message(
                             email_id=email_id,
                             device=parsed.event.device,
@@ -334,25 +417,29 @@ async def _poll_once(
                     recipients = await db.list_recipients_for_device(device=parsed.event.device)
                 except Exception:
                     recipients = []
-                msg_level = str(getattr(dispatch.risk_level, "value", dispatch.risk_level)).upper()
-                msg_rank = _RISK_RANK.get(msg_level, 0)
-                for r_chat_id, _r_user_id, min_risk, enabled in recipients:
-                    if not enabled:
-                        continue
-                    if int(r_chat_id) in set(admin_chats):
-                        continue
-                    mr = (min_risk or "MEDIUM").strip().upper()
-                    if msg_rank < _RISK_RANK.get(mr, 2):
+                # DispatchMessage validates risk_level into RiskLevel, so the lookup cannot miss.
+                msg_rank = _RISK_RANK_BY_ENUM[dispatch.risk_level]
+                owner_chats = [c for c, rank in _active_owners(recipients, admin_chats_set) if msg_rank >= rank]
+                # Owners receive alerts without raw-email access by default (safe).
+                results = await _fan_out(
+                    owner_chats,
+                    lambda cid: send_dispatch(send_bot, cid, dispatch, include_details_button=False),
+                )
+                for r_chat_id, res in zip(owner_chats, results):
+                    if isinstance(res, BaseException):
+                        logger.error(
+                            "Telegram send failed to recipient chat_id=%s for email_id=%s",
+                            r_chat_id,
+                            email_id,
+                            exc_info=res,
+                        )
                         continue
+                    sent_text, tg_message_id = res
                     try:
-                        # Owners receive alerts without raw-email access by default (safe).
-                        sent_text, tg_message_id = await send_dispatch(
-                            send_bot, int(r_chat_id), dispatch, include_details_button=False
-                        )
                         await db.add_telegram_message(
                             email_id=email_id,
                             device=parsed.event.device,
-                            chat_id=int(r_chat_id),
+                            chat_id=r_chat_id,
                             telegram_message_id=tg_message_id,
                             sent_at_utc=now,
                             risk_level=dispatch.risk_level.value,
@@ -368,24 +455,38 @@ async def _poll_once(
             except Exception:
                 logger.exception("Telegram send failed for email_id=%s (will NOT mark Seen)", email_id)
                 # Do not ack IMAP on send failure: allow retry later.
-                if close_after:
-                    await send_bot.session.close()
-                continue
-            if close_after:
-                await send_bot.session.close()
+                return False
             logger.info("Telegram: sent message for email_id=%s", email_id)
         else:
             logger.warning("TELEGRAM_CHAT_ID is not set; skipping send")
 
         if settings.imap_mark_seen:
-            uids_to_mark_seen.append(parsed.uid)
-        processed += 1
+            uids_to_mark_seen.add(parsed.uid)
+        return True
+
+    async def _bounded(m: Any) -> bool:
+        async with sem:
+            return await _process_one(m)
 
+    try:
+        results = await asyncio.gather(*(_bounded(m) for m in msgs), return_exceptions=True)
+    finally:
+        if owns_bot:
+            try:
+                await send_bot.session.close()
+            except Exception:
+                pass
+
+    # Messages that completed are acked even if another one failed; the failure is re-raised below.
     if settings.imap_mark_seen and uids_to_mark_seen:
-        n = await imap.mark_seen_many(uids_to_mark_seen)
+        # Unique + ascending UIDs (compact sequence for UID STORE).
+        n = await imap.mark_seen_many(sorted(uids_to_mark_seen, key=int))
         logger.info("IMAP ack: marked_seen=%s", n)
 
-    return processed
+    for res in results:
+        if isinstance(res, BaseException):
+            raise res
+    return sum(1 for res in results if res is True)
 
 
 async def run(settings: Settings) -> None:
@@ -395,24 +496,24 @@ async def run(settings: Settings) -> None:
     await db.init()
 
     # Telegram bot runtime (commands/callbacks)
-    admin_chats = []
-    if settings.telegram_chat_id:
-        admin_chats.append(settings.telegram_chat_id)
-    admin_chats.extend(settings.telegram_admin_chat_ids or [])
-    admin_chats = _dedup_ints(admin_chats)
+    admin_chats, _ = _collect_admin_chats(settings)
     runtime = build_bot(
         db=db,
         token=settings.telegram_bot_token,
         allowed_user_ids=settings.telegram_allowed_user_ids,
         admin_user_ids=settings.telegram_admin_user_ids,
-        admin_chat_ids=admin_chats,
+        admin_chat_ids=list(admin_chats),
     )
 
+    # One WebTools (and its keep-alive HTTP session) and one IMAP connection for the process lifetime.
+    web = WebTools(settings.serper_api_key, settings.tavily_api_key)
+    imap = _make_imap(settings)
+
     async def imap_loop() -> None:
         try:
             while True:
                 try:
-                    n = await _poll_once(settings, db, bot=runtime.bot)
+                    n = await _poll_once(settings, db, bot=runtime.bot, web=web, imap=imap)
                     if n:
                         logger.info("Processed %s alerts", n)
                 except Exception:
@@ -449,6 +550,10 @@ async def run(settings: Settings) -> None:
             await runtime.bot.session.close()
         except Exception:
             pass
+        try:
+            await imap.close()
+        except Exception:
+            pass
 
 
 async def run_once(settings: Settings, *, mode: str = "unseen", limit: int = 25) -> None:
@@ -456,7 +561,7 @@ async def run_once(settings: Settings, *, mode: str = "unseen", limit: int = 25)
     db = Database(settings.sqlite_path)
     await db.init()
     try:
-        bot = Bot(token=settings.telegram_bot_token) if settings.telegram_chat_id else None
+        bot = make_bot(settings.telegram_bot_token) if settings.telegram_chat_id else None
         try:
             n = await _poll_once(settings, db, bot=bot, mode=mode, limit=limit)
         finally:
@@ -1,24 +1,86 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+import functools
 import html
 import re
+import time
 from datetime import UTC, datetime, timedelta
+from typing import Any, Awaitable, Callable
 
 from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.filters import Command, CommandStart
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message as TgMessage
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message as TgMessage,
+)
 
 from soc_core.database import Database
 from soc_core.models import AssetType, DispatchMessage, RiskLevel
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    # optional speedup; aiogram uses stdlib json otherwise
+    orjson = None
+
 
 DETAILS_CB_PREFIX = "details:"
 ASSET_CB_PREFIX = "asset:"
 ASSET_PAGE_SIZE = 10
 ASSET_HISTORY_PAGE_SIZE = 10
-
-
+# Asset cards are re-rendered on every Refresh/Back tap; recipients are re-read at most this often.
+ASSET_RECIPIENTS_TTL_SECONDS = 2.0
+# "Bind owner" flow waiting for a user_id message expires after this (abandoned flows don't linger).
+BIND_SESSION_TTL_SECONDS = 300
+BIND_SESSIONS_MAX = 128
+# Raw emails longer than this are sent as one .txt document instead of many <pre> messages.
+RAW_EMAIL_AS_DOCUMENT_CHARS = 10_000
+
+# asset:<action>: callback prefixes (built once; used by keyboards and the patterns below)
+_CB_LIST = ASSET_CB_PREFIX + "list:"
+_CB_OPEN = ASSET_CB_PREFIX + "open:"
+_CB_SET = ASSET_CB_PREFIX + "set:"
+_CB_HIST = ASSET_CB_PREFIX + "hist:"
+_CB_HISTOPEN = ASSET_CB_PREFIX + "histopen:"
+_CB_BIND = ASSET_CB_PREFIX + "bind:"
+_CB_OCLR = ASSET_CB_PREFIX + "oclr:"
+_CB_DELC = ASSET_CB_PREFIX + "delc:"
+_CB_DEL = ASSET_CB_PREFIX + "del:"
+
+# Full callback_data formats; int groups are captured directly (no split/index/int chains).
+_RE_CB_LIST = re.compile(re.escape(_CB_LIST) + r"(\d+)")
+_RE_CB_OPEN = re.compile(re.escape(_CB_OPEN) + r"(\d+):(\d+)")
+_RE_CB_OCLR = re.compile(re.escape(_CB_OCLR) + r"(\d+):(\d+)")
+_RE_CB_DELC = re.compile(re.escape(_CB_DELC) + r"(\d+):(\d+)")
+_RE_CB_DEL = re.compile(re.escape(_CB_DEL) + r"(\d+):(\d+)")
+_RE_CB_SET = re.compile(re.escape(_CB_SET) + r"(\d+):(\w+):(\d+)")
+_RE_CB_BIND = re.compile(re.escape(_CB_BIND) + r"(\d+):(\d+):(\w+)")
+_RE_CB_HIST = re.compile(re.escape(_CB_HIST) + r"(\d+):(\d+):(\d+)")
+_RE_CB_HISTOPEN = re.compile(re.escape(_CB_HISTOPEN) + r"(\d+):(\d+):(\d+):(\d+)")
+# Owner's Telegram user_id inside a free-text admin message (bind flow).
+_USER_ID_RE = re.compile(r"\b(\d{5,})\b")
+
+
+def _button(text: str, callback_data: str) -> InlineKeyboardButton:
+    # Text and callback_data are built here from trusted values: skip pydantic validation.
+    return InlineKeyboardButton.model_construct(text=text, callback_data=callback_data)
+
+
+def _markup(rows: list[list[InlineKeyboardButton]]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows)
+
+
+# Keyboard builders below depend only on their (hashable) arguments, and aiogram markups are
+# frozen models, so identical keyboards are built once and shared (bounded caches).
+
+
+@functools.lru_cache(maxsize=64)
 def _details_kb(email_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -27,16 +89,11 @@ def _details_kb(email_id: int) -> InlineKeyboardMarkup:
     )
 
 
-def _icon(level: RiskLevel) -> str:
-    if level in (RiskLevel.CRITICAL, RiskLevel.HIGH):
-        return "🔴"
-    if level == RiskLevel.MEDIUM:
-        return "🟡"
-    return "🟢"
-
-
-def _clamp(n: int, lo: int, hi: int) -> int:
-    return max(lo, min(hi, n))
+_ICONS: dict[RiskLevel, str] = {
+    RiskLevel.CRITICAL: "🔴",
+    RiskLevel.HIGH: "🔴",
+    RiskLevel.MEDIUM: "🟡",
+}
 
 
 def _assets_list_text(*, total: int, page: int, pages: int) -> str:
@@ -48,30 +105,39 @@ def _assets_list_text(*, total: int, page: int, pages: int) -> str:
     )
 
 
-def _assets_list_kb(items: list[tuple[int, str, AssetType]], *, page: int, pages: int) -> InlineKeyboardMarkup:
-    kb: list[list[InlineKeyboardButton]] = []
-    for asset_id, hostname, t in items:
-        kb.append(
-            [
-                InlineKeyboardButton(
-                    text=f"{hostname} ({t.value})",
-                    callback_data=f"{ASSET_CB_PREFIX}open:{asset_id}:{page}",
-                )
-            ]
-        )
+@functools.lru_cache(maxsize=1024)
+def _asset_row_button(asset_id: int, hostname: str, t: AssetType, page: int) -> InlineKeyboardButton:
+    return _button(f"{hostname} ({t.value})", f"{_CB_OPEN}{asset_id}:{page}")
+
+
+@functools.lru_cache(maxsize=256)
+def _nav_row(cb_base: str, page: int, pages: int) -> tuple[InlineKeyboardButton, ...]:
+    """
+    Prev / Refresh / Next row of a paged list; callback_data is cb_base + page number.
+    Single-page lists (the common case) get just the shared Refresh button.
+    """
+    refresh = _button("🔄 Refresh", f"{cb_base}{page}")
+    if pages <= 1:
+        return (refresh,)
     nav: list[InlineKeyboardButton] = []
     if page > 0:
-        nav.append(
-            InlineKeyboardButton(text="⬅ Prev", callback_data=f"{ASSET_CB_PREFIX}list:{page - 1}")
-        )
-    nav.append(InlineKeyboardButton(text="🔄 Refresh", callback_data=f"{ASSET_CB_PREFIX}list:{page}"))
+        nav.append(_button("⬅ Prev", f"{cb_base}{page - 1}"))
+    nav.append(refresh)
     if page < pages - 1:
-        nav.append(
-            InlineKeyboardButton(text="Next ➡", callback_data=f"{ASSET_CB_PREFIX}list:{page + 1}")
-        )
-    if nav:
-        kb.append(nav)
-    return InlineKeyboardMarkup(inline_keyboard=kb)
+        nav.append(_button("Next ➡", f"{cb_base}{page + 1}"))
+    return tuple(nav)
+
+
+def _assets_list_kb(items: list[tuple[int, str, AssetType]], *, page: int, pages: int) -> InlineKeyboardMarkup:
+    kb: list[list[InlineKeyboardButton]] = [
+        [_asset_row_button(asset_id, hostname, t, page)] for asset_id, hostname, t in items
+    ]
+    kb.append(list(_nav_row(_CB_LIST, page, pages)))
+    return _markup(kb)
+
+
+_UNCLASSIFIED_NOTE = "\n\nThis host is UNCLASSIFIED. Please set SERVER or WORKSTATION."
+_RECIPIENT_LINE = "\n- user_id=%s | min_risk=%s | %s"
 
 
 def _asset_manage_text(
@@ -80,56 +146,56 @@ def _asset_manage_text(
     *,
     recipients: list[tuple[int, int, str, bool]] | None = None,
 ) -> str:
-    extra = ""
+    parts = [f"Asset: {hostname}\nType: {t.value}"]
     if t == AssetType.UNCLASSIFIED:
-        extra = "\n\nThis host is UNCLASSIFIED. Please set SERVER or WORKSTATION."
-    rec = ""
+        parts.append(_UNCLASSIFIED_NOTE)
     if recipients:
-        lines = []
-        for _chat_id, user_id, min_risk, enabled in recipients:
-            state = "ON" if enabled else "OFF"
-            lines.append(f"- user_id={user_id} | min_risk={min_risk} | {state}")
-        rec = "\n\nRecipients (optional):\n" + "\n".join(lines)
-    return f"Asset: {hostname}\nType: {t.value}{extra}{rec}"
+        parts.append("\n\nRecipients (optional):")
+        parts.extend(
+            _RECIPIENT_LINE % (user_id, min_risk, "ON" if enabled else "OFF")
+            for _chat_id, user_id, min_risk, enabled in recipients
+        )
+    return "".join(parts)
 
 
+@functools.lru_cache(maxsize=256)
 def _asset_manage_kb(asset_id: int, *, page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
                     text="✅ Mark SERVER",
-                    callback_data=f"{ASSET_CB_PREFIX}set:{asset_id}:{AssetType.SERVER.value}:{page}",
+                    callback_data=f"{_CB_SET}{asset_id}:{AssetType.SERVER.value}:{page}",
                 ),
                 InlineKeyboardButton(
                     text="✅ Mark WORKSTATION",
-                    callback_data=f"{ASSET_CB_PREFIX}set:{asset_id}:{AssetType.WORKSTATION.value}:{page}",
+                    callback_data=f"{_CB_SET}{asset_id}:{AssetType.WORKSTATION.value}:{page}",
                 ),
             ],
             [
                 InlineKeyboardButton(
                     text="📜 History (8d)",
-                    callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{page}:0",
+                    callback_data=f"{_CB_HIST}{asset_id}:{page}:0",
                 ),
             ],
             [
                 InlineKeyboardButton(
                     text="➕ Bind owner",
-                    callback_data=f"{ASSET_CB_PREFIX}bind:{asset_id}:{page}:MEDIUM",
+                    callback_data=f"{_CB_BIND}{asset_id}:{page}:MEDIUM",
                 )
             ],
             [
                 InlineKeyboardButton(
                     text="🧹 Clear owners",
-                    callback_data=f"{ASSET_CB_PREFIX}oclr:{asset_id}:{page}",
+                    callback_data=f"{_CB_OCLR}{asset_id}:{page}",
                 )
             ],
             [
                 InlineKeyboardButton(
                     text="🗑 Delete",
-                    callback_data=f"{ASSET_CB_PREFIX}delc:{asset_id}:{page}",
+                    callback_data=f"{_CB_DELC}{asset_id}:{page}",
                 ),
-                InlineKeyboardButton(text="⬅ Back", callback_data=f"{ASSET_CB_PREFIX}list:{page}"),
+                InlineKeyboardButton(text="⬅ Back", callback_data=f"{_CB_LIST}{page}"),
             ],
         ]
     )
@@ -146,6 +212,7 @@ def _bind_owner_text(hostname: str, *, min_risk: str) -> str:
     )
 
 
+@functools.lru_cache(maxsize=256)
 def _bind_owner_kb(asset_id: int, *, page: int, min_risk: str) -> InlineKeyboardMarkup:
     mr = (min_risk or "MEDIUM").upper()
     return InlineKeyboardMarkup(
@@ -153,45 +220,48 @@ def _bind_owner_kb(asset_id: int, *, page: int, min_risk: str) -> InlineKeyboard
             [
                 InlineKeyboardButton(
                     text=("✅ INFO" if mr == "INFO" else "INFO"),
-                    callback_data=f"{ASSET_CB_PREFIX}bind:{asset_id}:{page}:INFO",
+                    callback_data=f"{_CB_BIND}{asset_id}:{page}:INFO",
                 ),
                 InlineKeyboardButton(
                     text=("✅ MEDIUM" if mr == "MEDIUM" else "MEDIUM"),
-                    callback_data=f"{ASSET_CB_PREFIX}bind:{asset_id}:{page}:MEDIUM",
+                    callback_data=f"{_CB_BIND}{asset_id}:{page}:MEDIUM",
                 ),
             ],
             [
                 InlineKeyboardButton(
                     text=("✅ HIGH" if mr == "HIGH" else "HIGH"),
-                    callback_data=f"{ASSET_CB_PREFIX}bind:{asset_id}:{page}:HIGH",
+                    callback_data=f"{_CB_BIND}{asset_id}:{page}:HIGH",
                 ),
                 InlineKeyboardButton(
                     text=("✅ CRITICAL" if mr == "CRITICAL" else "CRITICAL"),
-                    callback_data=f"{ASSET_CB_PREFIX}bind:{asset_id}:{page}:CRITICAL",
+                    callback_data=f"{_CB_BIND}{asset_id}:{page}:CRITICAL",
                 ),
             ],
             [
                 InlineKeyboardButton(
                     text="⬅ Back to asset",
-                    callback_data=f"{ASSET_CB_PREFIX}open:{asset_id}:{page}",
+                    callback_data=f"{_CB_OPEN}{asset_id}:{page}",
                 )
             ],
         ]
     )
 
+
+@functools.lru_cache(maxsize=256)
 def _asset_delete_confirm_kb(asset_id: int, *, page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
                     text="YES, delete",
-                    callback_data=f"{ASSET_CB_PREFIX}del:{asset_id}:{page}",
+                    callback_data=f"{_CB_DEL}{asset_id}:{page}",
                 ),
-                InlineKeyboardButton(text="Cancel", callback_data=f"{ASSET_CB_PREFIX}open:{asset_id}:{page}"),
+                InlineKeyboardButton(text="Cancel", callback_data=f"{_CB_OPEN}{asset_id}:{page}"),
             ]
         ]
     )
 
+
 def _history_list_text(hostname: str, *, total: int, page: int, pages: int) -> str:
     return (
         f"History (last 8 days) for: {hostname}\n"
@@ -209,58 +279,48 @@ def _history_list_kb(
     pages: int,
 ) -> InlineKeyboardMarkup:
     kb: list[list[InlineKeyboardButton]] = []
+    row_cb = f"{_CB_HISTOPEN}{asset_id}:{asset_page}:{page}:"
     for tg_msg_id, sent_at, risk, email_id, model_used in rows:
-        stamp = sent_at.astimezone(UTC).strftime("%Y-%m-%d %H:%M")
+        if sent_at.tzinfo is not None:
+            sent_at = sent_at.astimezone(UTC)
+        # SQLite returns naive datetimes for timezone=True columns; they are stored as UTC.
+        stamp = f"{sent_at.year:04d}-{sent_at.month:02d}-{sent_at.day:02d} {sent_at.hour:02d}:{sent_at.minute:02d}"
         model = (model_used or "-")
-        kb.append(
-            [
-                InlineKeyboardButton(
-                    text=f"{stamp} | {risk} | email_id={email_id} | {model}",
-                    callback_data=f"{ASSET_CB_PREFIX}histopen:{asset_id}:{asset_page}:{page}:{tg_msg_id}",
-                )
-            ]
-        )
+        kb.append([_button(f"{stamp} | {risk} | email_id={email_id} | {model}", f"{row_cb}{tg_msg_id}")])
 
-    nav: list[InlineKeyboardButton] = []
-    if page > 0:
-        nav.append(
-            InlineKeyboardButton(
-                text="⬅ Prev",
-                callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{asset_page}:{page - 1}",
-            )
-        )
-    nav.append(
-        InlineKeyboardButton(
-            text="🔄 Refresh",
-            callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{asset_page}:{page}",
-        )
-    )
-    if page < pages - 1:
-        nav.append(
-            InlineKeyboardButton(
-                text="Next ➡",
-                callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{asset_page}:{page + 1}",
-            )
-        )
-    if nav:
-        kb.append(nav)
-    kb.append([InlineKeyboardButton(text="⬅ Back to asset", callback_data=f"{ASSET_CB_PREFIX}open:{asset_id}:{asset_page}")])
-    return InlineKeyboardMarkup(inline_keyboard=kb)
+    kb.append(list(_nav_row(f"{_CB_HIST}{asset_id}:{asset_page}:", page, pages)))
+    kb.append([_button("⬅ Back to asset", f"{_CB_OPEN}{asset_id}:{asset_page}")])
+    return _markup(kb)
 
 
+@functools.lru_cache(maxsize=256)
 def _history_view_kb(*, asset_id: int, asset_page: int, hist_page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
                     text="⬅ Back to history",
-                    callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{asset_page}:{hist_page}",
+                    callback_data=f"{_CB_HIST}{asset_id}:{asset_page}:{hist_page}",
                 )
             ]
         ]
     )
 
 
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def make_bot(token: str) -> Bot:
+    """
+    Creates a Bot. With orjson installed, its API session (de)serializes JSON (reply markups,
+    API responses) with orjson instead of stdlib json.
+    """
+    if orjson is None:
+        return Bot(token=token)
+    return Bot(token=token, session=AiohttpSession(json_loads=orjson.loads, json_dumps=_orjson_dumps))
+
+
 @dataclass
 class BotRuntime:
     bot: Bot
@@ -276,7 +336,7 @@ def build_bot(
     admin_user_ids: list[int] | None = None,
     admin_chat_ids: list[int] | None = None,
 ) -> BotRuntime:
-    bot = Bot(token=token)
+    bot = make_bot(token)
     router = Router()
     dp = Dispatcher()
     dp.include_router(router)
@@ -285,16 +345,44 @@ def build_bot(
     # - users can always /start to see their user_id (onboarding)
     # - only admins (TELEGRAM_ADMIN_USER_IDS) can manage /assets and view raw emails
     # `allowed_user_ids` is kept for backward compatibility but is not used to block /start.
-    allowed_set = set(allowed_user_ids or [])
-    admin_set = set(admin_user_ids or []) or allowed_set
+    # Checked on every update; None (no from_user) is never a member.
+    admin_set = frozenset(admin_user_ids or allowed_user_ids or ())
     admin_chats = list(admin_chat_ids or [])
-    # admin_user_id -> (asset_id, asset_page, min_risk, origin_chat_id, origin_message_id)
-    bind_sessions: dict[int, tuple[int, int, str, int, int]] = {}
+    # admin_user_id -> (asset_id, asset_page, min_risk, origin_chat_id, origin_message_id, started_at_monotonic)
+    bind_sessions: dict[int, tuple[int, int, str, int, int, float]] = {}
 
-    def _is_admin(user_id: int | None) -> bool:
-        if user_id is None:
+    def _has_bind_session(uid: int) -> bool:
+        sess = bind_sessions.get(uid)
+        if sess is None:
             return False
-        return user_id in admin_set
+        if time.monotonic() - sess[5] > BIND_SESSION_TTL_SECONDS:
+            del bind_sessions[uid]
+            return False
+        return True
+
+    def _start_bind_session(uid: int, sess: tuple[int, int, str, int, int]) -> None:
+        now = time.monotonic()
+        if len(bind_sessions) >= BIND_SESSIONS_MAX:
+            for k in [k for k, v in bind_sessions.items() if now - v[5] > BIND_SESSION_TTL_SECONDS]:
+                del bind_sessions[k]
+            if len(bind_sessions) >= BIND_SESSIONS_MAX:
+                # dicts keep insertion order: drop the oldest flow
+                del bind_sessions[next(iter(bind_sessions))]
+        bind_sessions[uid] = (*sess, now)
+
+    # asset_id -> (monotonic_ts, list_asset_recipients_brief() rows); dropped on every recipients write.
+    recipients_cache: dict[int, tuple[float, list[tuple[int, int, str, bool]]]] = {}
+
+    async def _asset_recipients(asset_id: int) -> list[tuple[int, int, str, bool]]:
+        now = time.monotonic()
+        hit = recipients_cache.get(asset_id)
+        if hit is not None and now - hit[0] < ASSET_RECIPIENTS_TTL_SECONDS:
+            return hit[1]
+        recs = await db.list_asset_recipients_brief(asset_id=asset_id)
+        if len(recipients_cache) >= 256:
+            recipients_cache.clear()
+        recipients_cache[asset_id] = (now, recs)
+        return recs
 
     async def _deny_message(m: TgMessage) -> None:
         await m.answer("Access denied.")
@@ -323,7 +411,7 @@ def build_bot(
 
     @router.message(Command("bind"))
     async def bind_owner(m: TgMessage) -> None:
-        if not _is_admin(m.from_user.id if m.from_user else None):
+        if (m.from_user.id if m.from_user else None) not in admin_set:
             await _deny_message(m)
             return
         # /bind HOST USER_ID [MIN_RISK]
@@ -350,6 +438,7 @@ def build_bot(
         asset_id, hn, _t = asset
         # In private chat with the bot, chat_id == user_id (after /start). We store both.
         await db.upsert_asset_recipient(asset_id=asset_id, chat_id=user_id, user_id=user_id, min_risk=min_risk, enabled=True)
+        recipients_cache.pop(asset_id, None)
         await m.answer(f"OK: bound host `{hn}` -> owner user_id={user_id} (min_risk={min_risk}).")
 
     # Capture only non-command text messages (so it won't swallow /assets, /unbind, etc.)
@@ -362,21 +451,21 @@ def build_bot(
         uid = m.from_user.id if m.from_user else None
         if uid is None:
             return
-        if uid not in bind_sessions:
+        if not _has_bind_session(uid):
             return
-        if not _is_admin(uid):
+        if uid not in admin_set:
             bind_sessions.pop(uid, None)
             return
         text = (m.text or "").strip()
         # Ignore commands (admin might type /assets etc)
         if text.startswith("/"):
             return
-        mm = re.search(r"\b(\d{5,})\b", text)
+        mm = _USER_ID_RE.search(text)
         if not mm:
             await m.answer("Please send the owner's Telegram user_id as digits (e.g. 123456789).")
             return
         owner_id = int(mm.group(1))
-        asset_id, asset_page, min_risk, origin_chat_id, origin_message_id = bind_sessions.pop(uid)
+        asset_id, asset_page, min_risk, origin_chat_id, origin_message_id, _started = bind_sessions.pop(uid)
         asset = await db.get_asset_by_id(asset_id)
         if not asset:
             await m.answer("Host not found (asset deleted?).")
@@ -389,10 +478,10 @@ def build_bot(
             min_risk=min_risk,
             enabled=True,
         )
+        recipients_cache.pop(asset_id, None)
         # Update the assets card message (best-effort)
         try:
-            recs0 = await db.list_asset_recipients(asset_id=asset_id)
-            recs = [(r[1], r[2], r[3], r[4]) for r in recs0]
+            recs = await _asset_recipients(asset_id)
             await bot.edit_message_text(
                 chat_id=origin_chat_id,
                 message_id=origin_message_id,
@@ -405,7 +494,7 @@ def build_bot(
 
     @router.message(Command("unbind"))
     async def unbind_owner(m: TgMessage) -> None:
-        if not _is_admin(m.from_user.id if m.from_user else None):
+        if (m.from_user.id if m.from_user else None) not in admin_set:
             await _deny_message(m)
             return
         # /unbind HOST (clears all owners for host)
@@ -421,35 +510,34 @@ def build_bot(
             return
         asset_id, hn, _t = asset
         n = await db.clear_asset_recipients(asset_id=asset_id)
+        recipients_cache.pop(asset_id, None)
         await m.answer(f"OK: cleared {n} owner(s) for host `{hn}`.")
 
     @router.message(Command("add_asset"))
     async def add_asset(m: TgMessage) -> None:
-        if not _is_admin(m.from_user.id if m.from_user else None):
+        if (m.from_user.id if m.from_user else None) not in admin_set:
             await _deny_message(m)
             return
         await m.answer("This command is deprecated. Use /assets to classify hosts.")
 
     @router.message(Command("remove_asset"))
     async def remove_asset(m: TgMessage) -> None:
-        if not _is_admin(m.from_user.id if m.from_user else None):
+        if (m.from_user.id if m.from_user else None) not in admin_set:
             await _deny_message(m)
             return
         await m.answer("This command is deprecated. Use /assets to delete hosts.")
 
     async def _send_assets_list(m: TgMessage, *, page: int = 0) -> None:
-        if not _is_admin(m.from_user.id if m.from_user else None):
+        if (m.from_user.id if m.from_user else None) not in admin_set:
             await _deny_message(m)
             return
-        all_items = await db.list_assets_detailed()
-        total = len(all_items)
+        total = await db.count_assets()
         if total == 0:
             await m.answer("No assets yet. They will be auto-added on first seen events.")
             return
         pages = max(1, (total + ASSET_PAGE_SIZE - 1) // ASSET_PAGE_SIZE)
-        page = _clamp(page, 0, pages - 1)
-        start = page * ASSET_PAGE_SIZE
-        chunk = all_items[start : start + ASSET_PAGE_SIZE]
+        page = min(max(page, 0), pages - 1)
+        chunk = await db.list_assets_detailed_page(limit=ASSET_PAGE_SIZE, offset=page * ASSET_PAGE_SIZE)
         await m.answer(
             _assets_list_text(total=total, page=page, pages=pages),
             reply_markup=_assets_list_kb(chunk, page=page, pages=pages),
@@ -469,7 +557,7 @@ def build_bot(
         # Helps avoid 'Update is not handled' in logs for arbitrary messages.
         # If admin is in "bind owner" flow, don't spam fallback messages.
         uid = m.from_user.id if m.from_user else None
-        if uid is not None and uid in bind_sessions:
+        if uid is not None and _has_bind_session(uid):
             return
         await m.answer(
             "Unknown command. Use:\n"
@@ -478,84 +566,84 @@ def build_bot(
         )
 
     async def _edit_assets_list(cb: CallbackQuery, *, page: int) -> None:
-        all_items = await db.list_assets_detailed()
-        total = len(all_items)
+        total = await db.count_assets()
         pages = max(1, (total + ASSET_PAGE_SIZE - 1) // ASSET_PAGE_SIZE)
-        page = _clamp(page, 0, pages - 1)
-        start = page * ASSET_PAGE_SIZE
-        chunk = all_items[start : start + ASSET_PAGE_SIZE]
+        page = min(max(page, 0), pages - 1)
+        chunk = await db.list_assets_detailed_page(limit=ASSET_PAGE_SIZE, offset=page * ASSET_PAGE_SIZE)
         if cb.message:
             await cb.message.edit_text(
                 _assets_list_text(total=total, page=page, pages=pages),
                 reply_markup=_assets_list_kb(chunk, page=page, pages=pages),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}list:"))
-    async def assets_list_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
+    # action ("list", "open", ...) -> (pattern, converters, handler); dispatched by asset_cb below.
+    asset_routes: dict[
+        str, tuple[re.Pattern[str], tuple[Callable[[str], Any], ...], Callable[..., Awaitable[None]]]
+    ] = {}
+
+    def _asset_route(action: str, pattern: re.Pattern[str], *conv: Callable[[str], Any]):
+        """
+        Registers the handler for asset:<action>:... callbacks. It gets the pattern groups (passed
+        through `conv`) as positional args; malformed callback_data is ignored.
+        """
+
+        def deco(fn: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+            asset_routes[action] = (pattern, conv, fn)
+            return fn
+
+        return deco
+
+    @router.callback_query(F.data.startswith(ASSET_CB_PREFIX))
+    async def asset_cb(cb: CallbackQuery) -> None:
+        # One filter for all asset:* callbacks; the action token picks the route (dict lookup).
+        if (cb.from_user.id if cb.from_user else None) not in admin_set:
             await _deny_callback(cb)
             return
-        # leaving bind mode
-        if cb.from_user:
-            bind_sessions.pop(cb.from_user.id, None)
         try:
             await cb.answer()
         except Exception:
             pass
-        parts = (cb.data or "").split(":")
+        data = cb.data or ""
+        route = asset_routes.get(data[len(ASSET_CB_PREFIX) :].partition(":")[0])
+        if route is None:
+            return
+        pattern, conv, fn = route
+        mm = pattern.fullmatch(data)
+        if not mm:
+            return
+        await fn(cb, *(c(g) for c, g in zip(conv, mm.groups())))
+
+    @_asset_route("list", _RE_CB_LIST, int)
+    async def assets_list_cb(cb: CallbackQuery, page: int) -> None:
         # asset:list:<page>
-        try:
-            page = int(parts[2]) if len(parts) >= 3 else 0
-        except Exception:
-            page = 0
+        # leaving bind mode
+        if cb.from_user:
+            bind_sessions.pop(cb.from_user.id, None)
         await _edit_assets_list(cb, page=page)
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}open:"))
-    async def asset_open_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
+    @_asset_route("open", _RE_CB_OPEN, int, int)
+    async def asset_open_cb(cb: CallbackQuery, asset_id: int, page: int) -> None:
+        # asset:open:<id>:<page>
         # leaving bind mode
         if cb.from_user:
             bind_sessions.pop(cb.from_user.id, None)
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
-        # asset:open:<id>:<page>
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        page = int(parts[3]) if len(parts) >= 4 else 0
-        item = await db.get_asset_by_id(asset_id)
+        item, recs = await asyncio.gather(db.get_asset_by_id(asset_id), _asset_recipients(asset_id))
         if not item:
             if cb.message:
                 await cb.message.edit_text("Not found", reply_markup=_assets_list_kb([], page=page, pages=1))
             return
         _, hostname, t = item
-        recs0 = await db.list_asset_recipients(asset_id=asset_id)
-        recs = [(r[1], r[2], r[3], r[4]) for r in recs0]
         if cb.message:
             await cb.message.edit_text(
                 _asset_manage_text(hostname, t, recipients=recs),
                 reply_markup=_asset_manage_kb(asset_id, page=page),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}bind:"))
-    async def asset_bind_owner_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
+    @_asset_route("bind", _RE_CB_BIND, int, int, str.upper)
+    async def asset_bind_owner_cb(cb: CallbackQuery, asset_id: int, asset_page: int, min_risk: str) -> None:
+        # asset:bind:<asset_id>:<asset_page>:<min_risk>
         if not cb.from_user or not cb.message:
             return
-        parts = (cb.data or "").split(":")
-        # asset:bind:<asset_id>:<asset_page>:<min_risk>
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        asset_page = int(parts[3]) if len(parts) >= 4 else 0
-        min_risk = (parts[4] if len(parts) >= 5 else "MEDIUM").strip().upper()
         if min_risk not in ("INFO", "MEDIUM", "HIGH", "CRITICAL"):
             min_risk = "MEDIUM"
         asset = await db.get_asset_by_id(asset_id)
@@ -563,26 +651,17 @@ def build_bot(
             await cb.message.edit_text("Not found")
             return
         _, hostname, _t = asset
-        bind_sessions[cb.from_user.id] = (asset_id, asset_page, min_risk, cb.message.chat.id, cb.message.message_id)
+        _start_bind_session(
+            cb.from_user.id, (asset_id, asset_page, min_risk, cb.message.chat.id, cb.message.message_id)
+        )
         await cb.message.edit_text(
             _bind_owner_text(hostname, min_risk=min_risk),
             reply_markup=_bind_owner_kb(asset_id, page=asset_page, min_risk=min_risk),
         )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}set:"))
-    async def asset_set_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
+    @_asset_route("set", _RE_CB_SET, int, str, int)
+    async def asset_set_cb(cb: CallbackQuery, asset_id: int, t_raw: str, page: int) -> None:
         # asset:set:<id>:<type>:<page>
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        t_raw = parts[3] if len(parts) >= 4 else ""
-        page = int(parts[4]) if len(parts) >= 5 else 0
         try:
             t = AssetType(t_raw)
         except Exception:
@@ -593,32 +672,22 @@ def build_bot(
                 await cb.message.answer("Type must be SERVER or WORKSTATION.")
             return
         await db.set_asset_type_by_id(asset_id, t)
-        item = await db.get_asset_by_id(asset_id)
+        item, recs = await asyncio.gather(db.get_asset_by_id(asset_id), _asset_recipients(asset_id))
         if not item:
             await _edit_assets_list(cb, page=page)
             return
         _, hostname, t2 = item
-        recs0 = await db.list_asset_recipients(asset_id=asset_id)
-        recs = [(r[1], r[2], r[3], r[4]) for r in recs0]
         if cb.message:
             await cb.message.edit_text(
                 _asset_manage_text(hostname, t2, recipients=recs),
                 reply_markup=_asset_manage_kb(asset_id, page=page),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}oclr:"))
-    async def asset_owners_clear_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        page = int(parts[3]) if len(parts) >= 4 else 0
+    @_asset_route("oclr", _RE_CB_OCLR, int, int)
+    async def asset_owners_clear_cb(cb: CallbackQuery, asset_id: int, page: int) -> None:
+        # asset:oclr:<id>:<page>
         await db.clear_asset_recipients(asset_id=asset_id)
+        recipients_cache.pop(asset_id, None)
         item = await db.get_asset_by_id(asset_id)
         if not item:
             await _edit_assets_list(cb, page=page)
@@ -630,18 +699,9 @@ def build_bot(
                 reply_markup=_asset_manage_kb(asset_id, page=page),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}delc:"))
-    async def asset_delete_confirm_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        page = int(parts[3]) if len(parts) >= 4 else 0
+    @_asset_route("delc", _RE_CB_DELC, int, int)
+    async def asset_delete_confirm_cb(cb: CallbackQuery, asset_id: int, page: int) -> None:
+        # asset:delc:<id>:<page>
         item = await db.get_asset_by_id(asset_id)
         if not item:
             await _edit_assets_list(cb, page=page)
@@ -653,36 +713,16 @@ def build_bot(
                 reply_markup=_asset_delete_confirm_kb(asset_id, page=page),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}del:"))
-    async def asset_delete_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        page = int(parts[3]) if len(parts) >= 4 else 0
+    @_asset_route("del", _RE_CB_DEL, int, int)
+    async def asset_delete_cb(cb: CallbackQuery, asset_id: int, page: int) -> None:
+        # asset:del:<id>:<page>
         await db.delete_asset_by_id(asset_id)
+        recipients_cache.pop(asset_id, None)
         await _edit_assets_list(cb, page=page)
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}hist:"))
-    async def asset_history_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
+    @_asset_route("hist", _RE_CB_HIST, int, int, int)
+    async def asset_history_cb(cb: CallbackQuery, asset_id: int, asset_page: int, hist_page: int) -> None:
         # asset:hist:<asset_id>:<asset_page>:<hist_page>
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        asset_page = int(parts[3]) if len(parts) >= 4 else 0
-        hist_page = int(parts[4]) if len(parts) >= 5 else 0
-
         asset = await db.get_asset_by_id(asset_id)
         if not asset:
             if cb.message:
@@ -693,7 +733,7 @@ def build_bot(
         since = datetime.now(tz=UTC) - timedelta(days=8)
         total = await db.count_telegram_history_for_device(device=hostname, since_utc=since)
         pages = max(1, (total + ASSET_HISTORY_PAGE_SIZE - 1) // ASSET_HISTORY_PAGE_SIZE)
-        hist_page = _clamp(hist_page, 0, pages - 1)
+        hist_page = min(max(hist_page, 0), pages - 1)
         rows = await db.list_telegram_history_for_device(
             device=hostname,
             since_utc=since,
@@ -708,22 +748,11 @@ def build_bot(
                 ),
             )
 
-    @router.callback_query(F.data.startswith(f"{ASSET_CB_PREFIX}histopen:"))
-    async def asset_history_open_cb(cb: CallbackQuery) -> None:
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
-            await _deny_callback(cb)
-            return
-        try:
-            await cb.answer()
-        except Exception:
-            pass
-        parts = (cb.data or "").split(":")
+    @_asset_route("histopen", _RE_CB_HISTOPEN, int, int, int, int)
+    async def asset_history_open_cb(
+        cb: CallbackQuery, asset_id: int, asset_page: int, hist_page: int, tg_msg_id: int
+    ) -> None:
         # asset:histopen:<asset_id>:<asset_page>:<hist_page>:<tg_msg_id>
-        asset_id = int(parts[2]) if len(parts) >= 3 else 0
-        asset_page = int(parts[3]) if len(parts) >= 4 else 0
-        hist_page = int(parts[4]) if len(parts) >= 5 else 0
-        tg_msg_id = int(parts[5]) if len(parts) >= 6 else 0
-
         res = await db.get_telegram_message_text(tg_msg_id)
         if not res:
             if cb.message:
@@ -735,10 +764,10 @@ def build_bot(
             await cb.message.edit_text(
                 text_sent,
                 parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text="🧾 Raw email", callback_data=f"{DETAILS_CB_PREFIX}{email_id}")],
-                        [InlineKeyboardButton(text="⬅ Back to history", callback_data=f"{ASSET_CB_PREFIX}hist:{asset_id}:{asset_page}:{hist_page}")],
+                reply_markup=_markup(
+                    [
+                        [_button("🧾 Raw email", f"{DETAILS_CB_PREFIX}{email_id}")],
+                        [_button("⬅ Back to history", f"{_CB_HIST}{asset_id}:{asset_page}:{hist_page}")],
                     ]
                 ),
             )
@@ -746,7 +775,7 @@ def build_bot(
     @router.callback_query(F.data.startswith(DETAILS_CB_PREFIX))
     async def details(cb: CallbackQuery) -> None:
         # Raw email is admins-only (safe by default).
-        if not _is_admin(cb.from_user.id if cb.from_user else None):
+        if (cb.from_user.id if cb.from_user else None) not in admin_set:
             await _deny_callback(cb)
             return
         # ACK callback ASAP, otherwise Telegram may return:
@@ -764,24 +793,42 @@ def build_bot(
             if cb.message:
                 await cb.message.answer("Bad callback")
             return
+        if not cb.message:
+            # nowhere to reply (inaccessible message); don't load the raw email at all
+            return
         raw = await db.get_email_raw_text(email_id)
         if not raw:
-            if cb.message:
-                await cb.message.answer("Not found")
+            await cb.message.answer("Not found")
             return
-        # Telegram message size limit: split into chunks
-        chunk = 3500
-        if not cb.message:
+        if len(raw) > RAW_EMAIL_AS_DOCUMENT_CHARS:
+            # One upload instead of ceil(len/3500) messages; no HTML escaping needed.
+            await cb.message.answer_document(
+                BufferedInputFile(raw.encode("utf-8"), filename=f"email_{email_id}.txt"),
+            )
             return
-        for i in range(0, len(raw), chunk):
-            safe = html.escape(raw[i : i + chunk])
-            await cb.message.answer(f"<pre>{safe}</pre>", parse_mode="HTML")
+        # Telegram message size limit: split into chunks, all escaped up front.
+        # Sent one by one on purpose: concurrent sends may arrive out of order in the chat.
+        chunk = 3500
+        parts = [f"<pre>{html.escape(raw[i : i + chunk])}</pre>" for i in range(0, len(raw), chunk)]
+        for part in parts:
+            await cb.message.answer(part, parse_mode="HTML")
 
     # claim callbacks removed (manual admin binding flow)
 
     return BotRuntime(bot=bot, dp=dp, router=router)
 
 
+# Fan-out sends the same dispatch to every admin/owner chat; escape the body once per message, not per chat.
+@functools.lru_cache(maxsize=256)
+def _render_dispatch_text(level: RiskLevel, text: str) -> str:
+    # Use HTML to avoid Markdown escaping issues (paths/underscores/backslashes/etc).
+    # Wrap content in <pre> to keep monospace formatting for paths and hashes.
+    # Quotes are harmless in element text; most alerts (paths, hashes) contain none of &<> at all.
+    if "&" in text or "<" in text or ">" in text:
+        text = html.escape(text, quote=False)
+    return f"{_ICONS.get(level, '🟢')}\n<pre>{text}</pre>"
+
+
 async def send_dispatch(
     bot: Bot,
     chat_id: int,
@@ -789,10 +836,7 @@ async def send_dispatch(
     *,
     include_details_button: bool = True,
 ) -> tuple[str, int]:
-    # Use HTML to avoid Markdown escaping issues (paths/underscores/backslashes/etc).
-    # Wrap content in <pre> to keep monospace formatting for paths and hashes.
-    body = html.escape(msg.text)
-    text = f"{_icon(msg.risk_level)}\n<pre>{body}</pre>"
+    text = _render_dispatch_text(msg.risk_level, msg.text)
     kb = _details_kb(msg.email_id) if include_details_button else None
     m = await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", reply_markup=kb)
     return text, m.message_id
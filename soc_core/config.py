@@ -1,17 +1,60 @@
 from __future__ import annotations
 
+import os
+import re
+
 from pydantic import Field
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+# ";" and whitespace are separators too: "123;456 789" -> "123,456,789"
+_ID_TRANS = str.maketrans({";": ",", " ": ",", "\t": ",", "\n": ",", "\r": ","})
+# ASCII-only integer token (str.isdigit() also accepts "²" etc., which int() rejects).
+_ID_TOKEN_RE = re.compile(r"[+-]?[0-9]+")
+
+
+def _parse_ids(v) -> list[int]:
+    # Supports:
+    # - empty
+    # - "123,456 789"
+    # - [123, 456] (if provided as JSON array)
+    if v is None:
+        return []
+    if isinstance(v, list):
+        out = []
+        for x in v:
+            try:
+                out.append(int(x))
+            except Exception:
+                continue
+        return out
+    if isinstance(v, str):
+        s = v.strip()
+        if not s:
+            return []
+        # Regex prefilter instead of try/int/except per token; malformed tokens are skipped, never raised.
+        return [int(p) for p in s.translate(_ID_TRANS).split(",") if _ID_TOKEN_RE.fullmatch(p)]
+    try:
+        return [int(v)]
+    except Exception:
+        return []
+
+
+# Resolved once at import (cwd-relative, as before); None if absent so pydantic-settings skips the file probe.
+_ENV_FILE = os.path.abspath(".env")
+if not os.path.isfile(_ENV_FILE):
+    _ENV_FILE = None
+
+
 class Settings(BaseSettings):
     # enable_decoding=False:
     # pydantic-settings tries to JSON-decode "complex" env values (like list[int]).
     # If systemd EnvironmentFile provides an empty string (e.g. TELEGRAM_ADMIN_CHAT_IDS=),
     # JSON decoding fails with JSONDecodeError. We parse CSV ourselves in validators below.
+    # frozen=True: one instance is shared process-wide by load_settings(), so nobody may mutate it.
     model_config = SettingsConfigDict(
-        env_file=".env", env_file_encoding="utf-8", extra="ignore", enable_decoding=False
+        env_file=_ENV_FILE, env_file_encoding="utf-8", extra="ignore", enable_decoding=False, frozen=True
     )
 
     # IMAP
@@ -43,6 +86,8 @@ class Settings(BaseSettings):
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4o-mini", alias="OPENAI_MODEL")
     prompts_path: str | None = Field(default=None, alias="PROMPTS_PATH")
+    # Alerts processed in parallel within one IMAP poll (LLM/web/Telegram latency overlaps).
+    max_concurrent_alerts: int = Field(default=4, alias="MAX_CONCURRENT_ALERTS")
 
     # Tools
     serper_api_key: str | None = Field(default=None, alias="SERPER_API_KEY")
@@ -55,67 +100,63 @@ class Settings(BaseSettings):
     @classmethod
     def _empty_chat_id_to_none(cls, v):
         # allow TELEGRAM_CHAT_ID= (empty) in .env
-        if v is None:
-            return None
-        if isinstance(v, str) and v.strip() == "":
+        if v is None or (isinstance(v, str) and not v.strip()):
             return None
         return v
 
-    @field_validator("telegram_allowed_user_ids", mode="before")
-    @classmethod
-    def _parse_allowed_ids(cls, v):
-        # Supports:
-        # - empty
-        # - "123,456 789"
-        # - [123, 456] (if provided as JSON array)
-        if v is None:
-            return []
-        if isinstance(v, list):
-            out = []
-            for x in v:
-                try:
-                    out.append(int(x))
-                except Exception:
-                    continue
-            return out
-        if isinstance(v, str):
-            s = v.strip()
-            if not s:
-                return []
-            parts = [p for p in s.replace(";", ",").replace(" ", ",").split(",") if p.strip()]
-            out = []
-            for p in parts:
-                try:
-                    out.append(int(p.strip()))
-                except Exception:
-                    continue
-            return out
-        try:
-            return [int(v)]
-        except Exception:
-            return []
-
-    @field_validator("telegram_admin_user_ids", mode="before")
-    @classmethod
-    def _parse_admin_user_ids(cls, v):
-        return cls._parse_allowed_ids(v)
-
-    @field_validator("telegram_admin_chat_ids", mode="before")
+    @field_validator(
+        "telegram_allowed_user_ids", "telegram_admin_user_ids", "telegram_admin_chat_ids", mode="before"
+    )
     @classmethod
-    def _parse_admin_chat_ids(cls, v):
-        return cls._parse_allowed_ids(v)
+    def _parse_id_lists(cls, v):
+        return _parse_ids(v)
 
     @field_validator("imap_poll_interval_seconds", mode="before")
     @classmethod
     def _poll_interval_min_5(cls, v):
         # Avoid too aggressive polling by accident
+        if isinstance(v, int) and not isinstance(v, bool):
+            return max(v, 5)
         try:
             iv = int(v)
         except Exception:
             return 60
         return max(iv, 5)
 
+    @field_validator("max_concurrent_alerts", mode="before")
+    @classmethod
+    def _concurrency_min_1(cls, v):
+        # Empty/invalid -> default; 1 restores strictly sequential processing
+        if isinstance(v, int) and not isinstance(v, bool):
+            return max(v, 1)
+        try:
+            iv = int(v)
+        except Exception:
+            return 4
+        return max(iv, 1)
+
+
+# (settings, .env st_mtime_ns); rebuilt only when the .env file changes.
+_cached: tuple[Settings, int] | None = None
 
-def load_settings() -> Settings:
-    return Settings()
 
+def _env_mtime_ns() -> int:
+    if _ENV_FILE is None:
+        return 0
+    try:
+        return os.stat(_ENV_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def load_settings() -> Settings:
+    """
+    Process-wide Settings. Costs one stat() per call; .env is re-read and re-validated only after it changes.
+    """
+    global _cached
+    mtime = _env_mtime_ns()
+    if _cached is not None and _cached[1] == mtime:
+        return _cached[0]
+    s = Settings()
+    _cached = (s, mtime)
+    return s
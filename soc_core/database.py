@@ -1,10 +1,30 @@
 from __future__ import annotations
 
+import time
+from collections import OrderedDict
 from datetime import UTC, datetime, timedelta
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, UniqueConstraint, select
+from sqlalchemy import (
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    bindparam,
+    case,
+    delete,
+    event,
+    exists,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from soc_core.models import AssetType, KasperskyEvent
 
@@ -55,6 +75,8 @@ class EmailORM(Base):
 
 class EventORM(Base):
     __tablename__ = "events"
+    # recent_devices_for_detection(): detection_name = ? AND created_at_utc >= ?
+    __table_args__ = (Index("ix_events_det_created", "detection_name", "created_at_utc"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     email_id: Mapped[int] = mapped_column(ForeignKey("emails.id"), index=True)
@@ -89,6 +111,8 @@ class DedupORM(Base):
 
 class TelegramMessageORM(Base):
     __tablename__ = "telegram_messages"
+    # Device history: device = ? AND sent_at_utc >= ? ORDER BY sent_at_utc DESC (range scan, no sort)
+    __table_args__ = (Index("ix_tg_dev_sentat", "device", "sent_at_utc"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     email_id: Mapped[int] = mapped_column(ForeignKey("emails.id"), index=True)
@@ -109,39 +133,169 @@ class TelegramMessageORM(Base):
     email: Mapped["EmailORM"] = relationship(back_populates="tg_messages")
 
 
+# Applied to every new DB-API connection. WAL + synchronous=NORMAL: one fsync per checkpoint instead of
+# two per commit, and bot reads are not blocked by the poller's writes.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _set_sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            cur.execute(pragma)
+    finally:
+        cur.close()
+
+
+# hostname -> (stored_at_monotonic, (id, hostname, raw type) or None). Assets are read on every alert but
+# change only via bot/admin actions; those paths invalidate. The TTL bounds staleness from other processes.
+_ASSET_CACHE_TTL_SECONDS = 300
+_ASSET_CACHE_MAX = 4096
+# list_servers() feeds every LLM prompt; server set only changes via asset add/remove/reclassify.
+_SERVERS_CACHE_TTL_SECONDS = 30
+
+
+def _as_utc(dt: datetime | None) -> datetime | None:
+    if dt is None:
+        return None
+    # SQLite often returns naive datetimes even if timezone=True
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=UTC)
+    return dt.astimezone(UTC)
+
+
+# Hot per-event/per-callback lookups, built once with bind params instead of a fresh select() per call.
+_STMT_ASSET_BY_HOSTNAME = select(AssetORM.id, AssetORM.hostname, AssetORM.type).where(
+    AssetORM.hostname == bindparam("hostname")
+)
+_STMT_ASSET_BY_ID = select(AssetORM.id, AssetORM.hostname, AssetORM.type).where(AssetORM.id == bindparam("asset_id"))
+# SELECT EXISTS(...) -> a single 0/1 row, always present
+_STMT_EMAIL_TG_SENT = select(
+    exists().where(EmailORM.id == bindparam("email_id")).where(EmailORM.telegram_sent == 1)
+)
+_STMT_HAS_TG_MESSAGE = select(
+    exists()
+    .where(TelegramMessageORM.email_id == bindparam("email_id"))
+    .where(TelegramMessageORM.chat_id == bindparam("chat_id"))
+)
+
+
+_SOFT_MIGRATIONS_VERSION = "1"
+
+# Accepted asset_recipients.min_risk values (LOW is not offered as a threshold).
+_VALID_MIN_RISK = frozenset(("INFO", "MEDIUM", "HIGH", "CRITICAL"))
+
+# Raw assets.type -> AssetType; unknown/empty values are a dict miss instead of a ValueError.
+_ASSET_TYPES: dict[str, AssetType] = {t.value: t for t in AssetType}
+
+# Asset manager order. Unknown/empty types count as UNCLASSIFIED (shown first).
+_STMT_ASSETS_DETAILED = select(AssetORM.id, AssetORM.hostname, AssetORM.type).order_by(
+    case(
+        (AssetORM.type == AssetType.SERVER.value, 1),
+        (AssetORM.type == AssetType.WORKSTATION.value, 2),
+        else_=0,
+    ),
+    func.lower(AssetORM.hostname),
+    AssetORM.id,
+)
+
+
+def _typed_asset_rows(rows) -> list[tuple[int, str, AssetType]]:
+    unclassified = AssetType.UNCLASSIFIED
+    return [(asset_id, hostname, _ASSET_TYPES.get(type_, unclassified)) for asset_id, hostname, type_ in rows]
+
+
 class Database:
     def __init__(self, sqlite_path: str):
         self.sqlite_path = sqlite_path
-        self.engine: AsyncEngine = create_async_engine(f"sqlite+aiosqlite:///{sqlite_path}")
+        url = f"sqlite+aiosqlite:///{sqlite_path}"
+        if sqlite_path and sqlite_path != ":memory:" and not sqlite_path.startswith("file::memory:"):
+            # aiosqlite file URLs default to NullPool (new connection + thread per checkout) in SQLAlchemy 2.0.
+            # A queue pool keeps connections warm; LIFO keeps reusing the same few, so PRAGMAs below
+            # run once per pooled connection.
+            self.engine: AsyncEngine = create_async_engine(
+                url, poolclass=AsyncAdaptedQueuePool, pool_size=5, max_overflow=10, pool_use_lifo=True
+            )
+            # WAL needs a real file; in-memory DBs keep the defaults.
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
+        else:
+            # in-memory: dialect's default pool (one shared connection), otherwise each checkout gets an empty DB
+            self.engine = create_async_engine(url)
         self.Session: async_sessionmaker[AsyncSession] = async_sessionmaker(
             bind=self.engine, expire_on_commit=False
         )
+        self._asset_cache: OrderedDict[str, tuple[float, tuple[int, str, str] | None]] = OrderedDict()
+        self._servers_cache: tuple[float, list[str]] | None = None
+
+    async def _first(self, stmt, params: dict | None = None):
+        # Read-only one-shot lookups: plain connection, no Session / identity map / flush machinery.
+        async with self.engine.connect() as conn:
+            return (await conn.execute(stmt, params)).first()
 
     async def init(self) -> None:
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
-            # Soft migrations / data hygiene for SQLite.
-            # 1) Ensure assets.type is non-null-ish for old rows.
-            try:
-                await conn.exec_driver_sql(
-                    "UPDATE assets SET type = :t WHERE type IS NULL OR TRIM(type) = ''",
-                    {"t": AssetType.UNCLASSIFIED.value},
-                )
-            except Exception:
-                # table might not exist on first init; create_all will handle it
-                pass
-            # 2) Backfill assets from already ingested events (after upgrades / DB resets).
-            try:
+            # Soft migrations / data hygiene for SQLite. They scan whole tables, so they run once per DB
+            # (tracked in `meta`); bump _SOFT_MIGRATIONS_VERSION when adding a step.
+            await conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            done = (
+                await conn.exec_driver_sql("SELECT value FROM meta WHERE key = 'soft_migrations'")
+            ).scalar()
+            if done != _SOFT_MIGRATIONS_VERSION:
+                # 1) Ensure assets.type is non-null-ish for old rows.
+                try:
+                    await conn.exec_driver_sql(
+                        "UPDATE assets SET type = :t WHERE type IS NULL OR TRIM(type) = ''",
+                        {"t": AssetType.UNCLASSIFIED.value},
+                    )
+                except Exception:
+                    # table might not exist on first init; create_all will handle it
+                    pass
+                # 2) Backfill assets from already ingested events (after upgrades / DB resets).
+                try:
+                    await conn.exec_driver_sql(
+                        "INSERT OR IGNORE INTO assets (hostname, type) "
+                        "SELECT DISTINCT device, :t FROM events "
+                        "WHERE device IS NOT NULL AND TRIM(device) != ''",
+                        {"t": AssetType.UNCLASSIFIED.value},
+                    )
+                except Exception:
+                    pass
                 await conn.exec_driver_sql(
-                    "INSERT OR IGNORE INTO assets (hostname, type) "
-                    "SELECT DISTINCT device, :t FROM events "
-                    "WHERE device IS NOT NULL AND TRIM(device) != ''",
-                    {"t": AssetType.UNCLASSIFIED.value},
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('soft_migrations', :v)",
+                    {"v": _SOFT_MIGRATIONS_VERSION},
                 )
-            except Exception:
-                pass
+            # 3) Composite indexes added after release (create_all() does not add indexes to existing tables).
+            for ddl in (
+                "CREATE INDEX IF NOT EXISTS ix_events_det_created ON events (detection_name, created_at_utc)",
+                "CREATE INDEX IF NOT EXISTS ix_tg_dev_sentat ON telegram_messages (device, sent_at_utc)",
+            ):
+                await conn.exec_driver_sql(ddl)
 
     # ===== Assets =====
+    async def _lookup_asset(self, hn: str) -> tuple[int, str, str] | None:
+        """
+        Cached (id, hostname, raw type) for a stripped hostname; None if the asset does not exist.
+        """
+        item = self._asset_cache.get(hn)
+        if item is not None and time.monotonic() - item[0] <= _ASSET_CACHE_TTL_SECONDS:
+            self._asset_cache.move_to_end(hn)
+            return item[1]
+        row = await self._first(_STMT_ASSET_BY_HOSTNAME, {"hostname": hn})
+        found = (row[0], row[1], row[2]) if row else None
+        self._asset_cache[hn] = (time.monotonic(), found)
+        self._asset_cache.move_to_end(hn)
+        while len(self._asset_cache) > _ASSET_CACHE_MAX:
+            self._asset_cache.popitem(last=False)
+        return found
+
     async def add_asset(self, hostname: str, asset_type: AssetType) -> None:
         hostname = hostname.strip()
         async with self.Session() as s:
@@ -151,6 +305,8 @@ class Database:
             else:
                 s.add(AssetORM(hostname=hostname, type=asset_type.value))
             await s.commit()
+        self._asset_cache.pop(hostname, None)
+        self._servers_cache = None
 
     async def ensure_asset(self, hostname: str | None) -> AssetType | None:
         """
@@ -163,19 +319,32 @@ class Database:
         hn = hostname.strip()
         if not hn:
             return None
+        cached = await self._lookup_asset(hn)
+        if cached is not None:
+            t = _ASSET_TYPES.get(cached[2])
+            if t is not None:
+                return t
+            # unknown type: repaired below
+        self._asset_cache.pop(hn, None)
+        unclassified = AssetType.UNCLASSIFIED.value
         async with self.Session() as s:
-            obj = await s.scalar(select(AssetORM).where(AssetORM.hostname == hn))
-            if not obj:
-                obj = AssetORM(hostname=hn, type=AssetType.UNCLASSIFIED.value)
-                s.add(obj)
-                await s.commit()
-                return AssetType.UNCLASSIFIED
-            try:
-                return AssetType(obj.type)
-            except Exception:
-                obj.type = AssetType.UNCLASSIFIED.value
-                await s.commit()
-                return AssetType.UNCLASSIFIED
+            # RETURNING yields a row only if the INSERT happened (no row on hostname conflict).
+            inserted = (
+                await s.execute(
+                    sqlite_insert(AssetORM)
+                    .values(hostname=hn, type=unclassified)
+                    .on_conflict_do_nothing(index_elements=[AssetORM.hostname])
+                    .returning(AssetORM.id)
+                )
+            ).first()
+            if inserted is None:
+                # Existing row: created concurrently, or stored with an unknown type (repair it).
+                current = _ASSET_TYPES.get(await s.scalar(select(AssetORM.type).where(AssetORM.hostname == hn)))
+                if current is not None:
+                    return current
+                await s.execute(update(AssetORM).where(AssetORM.hostname == hn).values(type=unclassified))
+            await s.commit()
+        return AssetType.UNCLASSIFIED
 
     async def get_asset_by_hostname(self, hostname: str | None) -> tuple[int, str, AssetType] | None:
         if not hostname:
@@ -183,15 +352,10 @@ class Database:
         hn = hostname.strip()
         if not hn:
             return None
-        async with self.Session() as s:
-            obj = await s.scalar(select(AssetORM).where(AssetORM.hostname == hn))
-            if not obj:
-                return None
-            try:
-                t = AssetType(obj.type)
-            except Exception:
-                t = AssetType.UNCLASSIFIED
-            return obj.id, obj.hostname, t
+        row = await self._lookup_asset(hn)
+        if not row:
+            return None
+        return row[0], row[1], _ASSET_TYPES.get(row[2], AssetType.UNCLASSIFIED)
 
     # ===== Asset recipients (optional per-host notifications) =====
     async def upsert_asset_recipient(
@@ -205,7 +369,7 @@ class Database:
     ) -> None:
         now = datetime.now(tz=UTC)
         mr = (min_risk or "MEDIUM").strip().upper()
-        if mr not in ("INFO", "MEDIUM", "HIGH", "CRITICAL"):
+        if mr not in _VALID_MIN_RISK:
             mr = "MEDIUM"
         async with self.Session() as s:
             existing = await s.scalar(
@@ -234,14 +398,30 @@ class Database:
         """
         Returns [(id, chat_id, user_id, min_risk, enabled)].
         """
+        q = select(
+            AssetRecipientORM.id,
+            AssetRecipientORM.chat_id,
+            AssetRecipientORM.user_id,
+            AssetRecipientORM.min_risk,
+            AssetRecipientORM.enabled,
+        ).where(AssetRecipientORM.asset_id == asset_id)
         async with self.Session() as s:
-            rows = (
-                await s.execute(select(AssetRecipientORM).where(AssetRecipientORM.asset_id == asset_id))
-            ).scalars().all()
-        out: list[tuple[int, int, int, str, bool]] = []
-        for r in rows:
-            out.append((r.id, int(r.chat_id), int(r.user_id), (r.min_risk or "MEDIUM"), bool(r.enabled)))
-        return out
+            rows = (await s.execute(q)).all()
+        return [(rid, int(c), int(u), (mr or "MEDIUM"), bool(en)) for rid, c, u, mr, en in rows]
+
+    async def list_asset_recipients_brief(self, *, asset_id: int) -> list[tuple[int, int, str, bool]]:
+        """
+        Returns [(chat_id, user_id, min_risk, enabled)] (list_asset_recipients() without the row id).
+        """
+        q = select(
+            AssetRecipientORM.chat_id,
+            AssetRecipientORM.user_id,
+            AssetRecipientORM.min_risk,
+            AssetRecipientORM.enabled,
+        ).where(AssetRecipientORM.asset_id == asset_id)
+        async with self.Session() as s:
+            rows = (await s.execute(q)).all()
+        return [(int(c), int(u), (mr or "MEDIUM"), bool(en)) for c, u, mr, en in rows]
 
     async def delete_asset_recipient(self, recipient_id: int) -> bool:
         async with self.Session() as s:
@@ -254,15 +434,9 @@ class Database:
 
     async def clear_asset_recipients(self, *, asset_id: int) -> int:
         async with self.Session() as s:
-            rows = (
-                await s.execute(select(AssetRecipientORM).where(AssetRecipientORM.asset_id == asset_id))
-            ).scalars().all()
-            n = 0
-            for r in rows:
-                await s.delete(r)
-                n += 1
+            res = await s.execute(delete(AssetRecipientORM).where(AssetRecipientORM.asset_id == asset_id))
             await s.commit()
-            return n
+            return int(res.rowcount or 0)
 
     async def list_recipients_for_device(self, *, device: str | None) -> list[tuple[int, int, str, bool]]:
         """
@@ -273,17 +447,10 @@ class Database:
         d = device.strip()
         if not d:
             return []
-        async with self.Session() as s:
-            asset = await s.scalar(select(AssetORM).where(AssetORM.hostname == d))
-            if not asset:
-                return []
-            rows = (
-                await s.execute(select(AssetRecipientORM).where(AssetRecipientORM.asset_id == asset.id))
-            ).scalars().all()
-        out: list[tuple[int, int, str, bool]] = []
-        for r in rows:
-            out.append((int(r.chat_id), int(r.user_id), (r.min_risk or "MEDIUM"), bool(r.enabled)))
-        return out
+        asset = await self._lookup_asset(d)
+        if not asset:
+            return []
+        return await self.list_asset_recipients_brief(asset_id=asset[0])
 
     async def remove_asset(self, hostname: str) -> bool:
         hostname = hostname.strip()
@@ -293,7 +460,9 @@ class Database:
                 return False
             await s.delete(obj)
             await s.commit()
-            return True
+        self._asset_cache.pop(hostname, None)
+        self._servers_cache = None
+        return True
 
     async def delete_asset_by_id(self, asset_id: int) -> bool:
         async with self.Session() as s:
@@ -302,44 +471,45 @@ class Database:
                 return False
             await s.delete(obj)
             await s.commit()
-            return True
+        # keyed by hostname; id-based mutations are rare (bot UI), so just drop everything
+        self._asset_cache.clear()
+        self._servers_cache = None
+        return True
 
     async def list_assets(self) -> list[tuple[str, AssetType]]:
         async with self.Session() as s:
-            rows = (await s.execute(select(AssetORM).order_by(AssetORM.hostname.asc()))).scalars().all()
+            rows = (await s.execute(select(AssetORM.hostname, AssetORM.type).order_by(AssetORM.hostname.asc()))).all()
         out: list[tuple[str, AssetType]] = []
-        for r in rows:
-            try:
-                out.append((r.hostname, AssetType(r.type)))
-            except Exception:
-                continue
+        for hostname, type_ in rows:
+            t = _ASSET_TYPES.get(type_)
+            if t is not None:
+                out.append((hostname, t))
         return out
 
     async def list_assets_detailed(self) -> list[tuple[int, str, AssetType]]:
+        # sort (in SQL): UNCLASSIFIED first, then SERVER, WORKSTATION; then hostname
         async with self.Session() as s:
-            rows = (await s.execute(select(AssetORM))).scalars().all()
-        out: list[tuple[int, str, AssetType]] = []
-        for r in rows:
-            try:
-                t = AssetType(r.type)
-            except Exception:
-                t = AssetType.UNCLASSIFIED
-            out.append((r.id, r.hostname, t))
-        # sort: UNCLASSIFIED first, then hostname
-        prio = {AssetType.UNCLASSIFIED: 0, AssetType.SERVER: 1, AssetType.WORKSTATION: 2}
-        out.sort(key=lambda x: (prio.get(x[2], 9), (x[1] or "").lower()))
-        return out
+            rows = (await s.execute(_STMT_ASSETS_DETAILED)).all()
+        return _typed_asset_rows(rows)
 
-    async def get_asset_by_id(self, asset_id: int) -> tuple[int, str, AssetType] | None:
+    async def count_assets(self) -> int:
         async with self.Session() as s:
-            obj = await s.get(AssetORM, asset_id)
-            if not obj:
-                return None
-            try:
-                t = AssetType(obj.type)
-            except Exception:
-                t = AssetType.UNCLASSIFIED
-            return obj.id, obj.hostname, t
+            return int(await s.scalar(select(func.count()).select_from(AssetORM)) or 0)
+
+    async def list_assets_detailed_page(self, *, limit: int, offset: int = 0) -> list[tuple[int, str, AssetType]]:
+        """
+        One page of list_assets_detailed() (same order), sorted and sliced in SQL.
+        """
+        q = _STMT_ASSETS_DETAILED.offset(offset).limit(limit)
+        async with self.Session() as s:
+            rows = (await s.execute(q)).all()
+        return _typed_asset_rows(rows)
+
+    async def get_asset_by_id(self, asset_id: int) -> tuple[int, str, AssetType] | None:
+        row = await self._first(_STMT_ASSET_BY_ID, {"asset_id": asset_id})
+        if not row:
+            return None
+        return row[0], row[1], _ASSET_TYPES.get(row[2], AssetType.UNCLASSIFIED)
 
     async def set_asset_type_by_id(self, asset_id: int, asset_type: AssetType) -> bool:
         async with self.Session() as s:
@@ -348,7 +518,9 @@ class Database:
                 return False
             obj.type = asset_type.value
             await s.commit()
-            return True
+        self._asset_cache.clear()
+        self._servers_cache = None
+        return True
 
     async def get_asset_type(self, hostname: str | None) -> AssetType | None:
         if not hostname:
@@ -356,21 +528,20 @@ class Database:
         hostname = hostname.strip()
         if not hostname:
             return None
-        async with self.Session() as s:
-            obj = await s.scalar(select(AssetORM).where(AssetORM.hostname == hostname))
-            if not obj:
-                return None
-            try:
-                return AssetType(obj.type)
-            except Exception:
-                return None
+        row = await self._lookup_asset(hostname)
+        if not row:
+            return None
+        return _ASSET_TYPES.get(row[2])
 
     async def list_servers(self) -> list[str]:
-        async with self.Session() as s:
-            rows = (
-                await s.execute(select(AssetORM).where(AssetORM.type == AssetType.SERVER.value))
-            ).scalars().all()
-        return [r.hostname for r in rows]
+        cached = self._servers_cache
+        if cached is not None and time.monotonic() - cached[0] <= _SERVERS_CACHE_TTL_SECONDS:
+            return list(cached[1])
+        async with self.engine.connect() as conn:
+            rows = await conn.scalars(select(AssetORM.hostname).where(AssetORM.type == AssetType.SERVER.value))
+            servers = list(rows)
+        self._servers_cache = (time.monotonic(), servers)
+        return list(servers)
 
     # ===== Ingest =====
     async def upsert_email(
@@ -396,8 +567,9 @@ class Database:
                 date_utc=date_utc,
             )
             s.add(obj)
+            # flush() loads the autoincrement id; expire_on_commit=False keeps it readable after commit
+            await s.flush()
             await s.commit()
-            await s.refresh(obj)
             return obj.id, True
 
     async def mark_email_telegram_sent(self, email_id: int, when_utc: datetime) -> None:
@@ -437,8 +609,8 @@ class Database:
                 text_sent=text_sent,
             )
             s.add(obj)
+            await s.flush()
             await s.commit()
-            await s.refresh(obj)
             return obj.id
 
     async def list_telegram_history_for_device(
@@ -471,67 +643,82 @@ class Database:
                 .offset(offset)
                 .limit(limit)
             )
-            rows = (await s.execute(q)).all()
-        return [(r[0], r[1], r[2], r[3], r[4]) for r in rows]
+            # Row objects already unpack/index like the documented tuples.
+            return list((await s.execute(q)).all())
 
     async def count_telegram_history_for_device(self, *, device: str, since_utc: datetime) -> int:
         d = device.strip()
         if not d:
             return 0
+        q = (
+            select(func.count())
+            .select_from(TelegramMessageORM)
+            .where(TelegramMessageORM.device == d)
+            .where(TelegramMessageORM.sent_at_utc >= since_utc)
+        )
         async with self.Session() as s:
-            q = select(TelegramMessageORM.id).where(TelegramMessageORM.device == d).where(
-                TelegramMessageORM.sent_at_utc >= since_utc
-            )
-            rows = (await s.execute(q)).all()
-        return len(rows)
+            return int(await s.scalar(q) or 0)
 
     async def get_telegram_message_text(self, tg_msg_id: int) -> tuple[str, int] | None:
         """
         Returns (text_sent, email_id) for a stored Telegram message.
         """
-        async with self.Session() as s:
-            obj = await s.get(TelegramMessageORM, tg_msg_id)
-            if not obj:
-                return None
-            return obj.text_sent, obj.email_id
+        row = await self._first(
+            select(TelegramMessageORM.text_sent, TelegramMessageORM.email_id).where(TelegramMessageORM.id == tg_msg_id)
+        )
+        return (row[0], row[1]) if row else None
 
     async def is_email_telegram_sent(self, email_id: int) -> bool:
-        async with self.Session() as s:
-            obj = await s.get(EmailORM, email_id)
-            return bool(obj and obj.telegram_sent)
+        row = await self._first(_STMT_EMAIL_TG_SENT, {"email_id": email_id})
+        return bool(row[0])
 
     async def get_latest_telegram_message_for_email(self, email_id: int) -> tuple[str, str] | None:
         """
         Returns (text_sent, risk_level) for the latest stored Telegram message for this email_id.
         Useful for "replay" to newly bound recipients without re-running AI.
         """
-        async with self.Session() as s:
-            q = (
-                select(TelegramMessageORM)
-                .where(TelegramMessageORM.email_id == email_id)
-                .order_by(TelegramMessageORM.id.desc())
-                .limit(1)
-            )
-            obj = (await s.execute(q)).scalars().first()
-            if not obj:
-                return None
-            return obj.text_sent, obj.risk_level
+        q = (
+            select(TelegramMessageORM.text_sent, TelegramMessageORM.risk_level)
+            .where(TelegramMessageORM.email_id == email_id)
+            .order_by(TelegramMessageORM.id.desc())
+            .limit(1)
+        )
+        row = await self._first(q)
+        return (row[0], row[1]) if row else None
 
     async def has_telegram_message(self, *, email_id: int, chat_id: int) -> bool:
+        row = await self._first(_STMT_HAS_TG_MESSAGE, {"email_id": email_id, "chat_id": int(chat_id)})
+        return bool(row[0])
+
+    async def existing_telegram_chats(self, *, email_id: int, chat_ids: list[int]) -> set[int]:
+        """
+        Returns the subset of chat_ids that already have a telegram_messages row for this email_id
+        (one IN query instead of has_telegram_message() per chat).
+        """
+        if not chat_ids:
+            return set()
         async with self.Session() as s:
             q = (
-                select(TelegramMessageORM.id)
+                select(TelegramMessageORM.chat_id)
                 .where(TelegramMessageORM.email_id == email_id)
-                .where(TelegramMessageORM.chat_id == int(chat_id))
-                .limit(1)
+                .where(TelegramMessageORM.chat_id.in_([int(c) for c in chat_ids]))
+                .distinct()
             )
-            return (await s.execute(q)).first() is not None
+            rows = (await s.execute(q)).scalars().all()
+        return {int(c) for c in rows}
 
     async def insert_event(self, email_id: int, ev: KasperskyEvent) -> int:
+        return (await self.insert_events(email_id, [ev]))[0]
+
+    async def insert_events(self, email_id: int, evs: list[KasperskyEvent]) -> list[int]:
+        """
+        Inserts all events in one transaction (one commit/fsync for the batch). Returns ids in input order.
+        """
+        if not evs:
+            return []
         now = datetime.now(tz=UTC)
-        fp = ev.fingerprint()
-        async with self.Session() as s:
-            obj = EventORM(
+        objs = [
+            EventORM(
                 email_id=email_id,
                 vendor_severity=ev.vendor_severity,
                 device=ev.device,
@@ -543,13 +730,18 @@ class Database:
                 user=ev.user,
                 result=ev.result,
                 event_time_utc=ev.event_time,
-                fingerprint=fp,
+                fingerprint=ev.fingerprint(),
                 created_at_utc=now,
             )
-            s.add(obj)
+            for ev in evs
+        ]
+        async with self.Session() as s:
+            s.add_all(objs)
+            # flush() loads the autoincrement ids; no refresh() round-trip needed
+            await s.flush()
+            ids = [o.id for o in objs]
             await s.commit()
-            await s.refresh(obj)
-            return obj.id
+        return ids
 
     async def recent_devices_for_detection(
         self, *, detection_name: str | None, since_utc: datetime, limit: int = 50
@@ -560,31 +752,23 @@ class Database:
         """
         if not detection_name:
             return []
+        q = (
+            select(EventORM.device)
+            .where(EventORM.created_at_utc >= since_utc)
+            .where(EventORM.detection_name == detection_name)
+            .where(EventORM.device.is_not(None))
+            .where(EventORM.device != "")
+            .group_by(EventORM.device)
+            # most recently seen first
+            .order_by(func.max(EventORM.created_at_utc).desc())
+            .limit(limit)
+        )
         async with self.Session() as s:
-            q = (
-                select(EventORM.device)
-                .where(EventORM.created_at_utc >= since_utc)
-                .where(EventORM.detection_name == detection_name)
-                .where(EventORM.device.is_not(None))
-                .limit(limit)
-            )
-            rows = (await s.execute(q)).scalars().all()
-        # distinct, stable order
-        seen: set[str] = set()
-        out: list[str] = []
-        for d in rows:
-            if not d:
-                continue
-            if d in seen:
-                continue
-            seen.add(d)
-            out.append(d)
-        return out
+            return list((await s.execute(q)).scalars().all())
 
     async def get_email_raw_text(self, email_id: int) -> str | None:
-        async with self.Session() as s:
-            obj = await s.get(EmailORM, email_id)
-            return obj.raw_text if obj else None
+        row = await self._first(select(EmailORM.raw_text).where(EmailORM.id == email_id))
+        return row[0] if row else None
 
     # ===== Dedup =====
     async def should_send_alert(
@@ -602,51 +786,44 @@ class Database:
         - Если повтор в окне window_seconds: инкрементировать счетчик, не слать новый алерт
           до превышения repeat_threshold.
         """
+        # One UPSERT per event. In SQLite's DO UPDATE SET every right-hand side sees the *old* row, so
+        # last_seen_utc/last_alert_at_utc below are the previous values. Datetimes are stored as naive UTC
+        # strings of one fixed format, so comparing them in SQL is a plain string compare.
+        cutoff = now_utc - timedelta(seconds=window_seconds)
+        new_alert_at = case(
+            # окно истекло — считаем это новым алертом
+            (DedupORM.last_seen_utc < cutoff, now_utc),
+            # превышен порог в окне — шлем "бёрст" сообщение, но не чаще окна
+            (
+                (DedupORM.count + 1 >= repeat_threshold)
+                & (DedupORM.last_alert_at_utc.is_(None) | (DedupORM.last_alert_at_utc < cutoff)),
+                now_utc,
+            ),
+            else_=DedupORM.last_alert_at_utc,
+        )
+        stmt = (
+            sqlite_insert(DedupORM)
+            .values(
+                fingerprint=fingerprint,
+                first_seen_utc=now_utc,
+                last_seen_utc=now_utc,
+                count=1,
+                last_alert_at_utc=now_utc,
+                last_email_id=email_id,
+            )
+            .on_conflict_do_update(
+                index_elements=[DedupORM.fingerprint],
+                set_={
+                    "count": DedupORM.count + 1,
+                    "last_alert_at_utc": new_alert_at,
+                    "last_seen_utc": now_utc,
+                    "last_email_id": email_id,
+                },
+            )
+            .returning(DedupORM.count, DedupORM.last_alert_at_utc)
+        )
         async with self.Session() as s:
-            row = await s.get(DedupORM, fingerprint)
-            if row is None:
-                s.add(
-                    DedupORM(
-                        fingerprint=fingerprint,
-                        first_seen_utc=now_utc,
-                        last_seen_utc=now_utc,
-                        count=1,
-                        last_alert_at_utc=now_utc,
-                        last_email_id=email_id,
-                    )
-                )
-                await s.commit()
-                return True, 1
-
-            def _as_utc(dt: datetime | None) -> datetime | None:
-                if dt is None:
-                    return None
-                # SQLite often returns naive datetimes even if timezone=True
-                if dt.tzinfo is None:
-                    return dt.replace(tzinfo=UTC)
-                return dt.astimezone(UTC)
-
-            row.last_seen_utc = _as_utc(row.last_seen_utc) or now_utc
-            row.last_alert_at_utc = _as_utc(row.last_alert_at_utc)
-
-            within = (now_utc - row.last_seen_utc) <= timedelta(seconds=window_seconds)
-            row.last_seen_utc = now_utc
-            row.count += 1
-            row.last_email_id = email_id
-
-            send = False
-            if not within:
-                # окно истекло — считаем это новым алертом
-                row.last_alert_at_utc = now_utc
-                send = True
-            elif row.count >= repeat_threshold and (
-                row.last_alert_at_utc is None
-                or (now_utc - row.last_alert_at_utc) > timedelta(seconds=window_seconds)
-            ):
-                # превышен порог в окне — шлем "бёрст" сообщение, но не чаще окна
-                row.last_alert_at_utc = now_utc
-                send = True
-
+            count, last_alert_at = (await s.execute(stmt)).one()
             await s.commit()
-            return send, row.count
-
+        # This event triggered an alert iff last_alert_at_utc was (re)set to now.
+        return _as_utc(last_alert_at) == _as_utc(now_utc), int(count)
@@ -2,9 +2,47 @@ from __future__ import annotations
 
 import asyncio
 import imaplib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 
+# One UID FETCH per batch instead of per message; larger sets gain little and some servers reject long commands.
+_FETCH_BATCH = 100
+# UIDs per STORE command when marking \\Seen (keeps the command line well below server limits).
+_STORE_BATCH = 500
+_UID_RE = re.compile(rb"UID (\d+)")
+# Reuse the logged-in connection between polls while it is younger than this (servers drop idle
+# sessions after ~30 min); older ones are replaced instead of NOOP-probed.
+_IMAP_REUSE_IDLE_SECONDS = 1500
+# Blocking imaplib calls run on their own small pool rather than the loop's default executor,
+# so slow IMAP round-trips cannot take threads from other to_thread work (parsing, enrichment).
+_IMAP_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="imap")
+
+
+async def _run_imap(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_IMAP_EXECUTOR, fn, *args)
+
+
+def _split_fetch_response(data: list) -> list[tuple[bytes | None, bytes, bytes]]:
+    """
+    Splits a multi-message FETCH response into [(uid, meta_line, payload)].
+    Servers put "UID n" either before the literal (in the tuple head) or after it (in the trailing bytes item).
+    """
+    out: list[tuple[bytes | None, bytes, bytes]] = []
+    for item in data:
+        if isinstance(item, tuple) and len(item) == 2:
+            m = _UID_RE.search(item[0])
+            out.append((m.group(1) if m else None, item[0], item[1]))
+        elif isinstance(item, bytes) and out and out[-1][0] is None:
+            m = _UID_RE.search(item)
+            if m:
+                out[-1] = (m.group(1), out[-1][1], out[-1][2])
+    return out
+
+
 @dataclass(frozen=True)
 class ImapMessage:
     uid: str
@@ -25,19 +63,27 @@ class ImapClient:
         self.username = username
         self.password = password
         self.mailbox = mailbox
+        # Cached fetch/ack connection (TLS + LOGIN + SELECT once, not per call); used from worker threads.
+        self._imap: imaplib.IMAP4_SSL | None = None
+        self._last_used = 0.0
+        self._conn_lock = threading.Lock()
 
     async def fetch_unseen_from(self, from_email: str, limit: int = 20) -> list[ImapMessage]:
-        return await asyncio.to_thread(self._fetch_from_sync, from_email, limit, True)
+        return await _run_imap(self._fetch_from_sync, from_email, limit, True)
 
     async def fetch_latest_from(self, from_email: str, limit: int = 20) -> list[ImapMessage]:
         """Fetch last N messages FROM sender regardless of \\Seen flag (useful for tests)."""
-        return await asyncio.to_thread(self._fetch_from_sync, from_email, limit, False)
+        return await _run_imap(self._fetch_from_sync, from_email, limit, False)
 
     async def mark_seen_many(self, uids: list[str]) -> int:
         """Mark given UIDs as \\Seen in the selected mailbox. Returns how many were attempted."""
         if not uids:
             return 0
-        return await asyncio.to_thread(self._mark_seen_many_sync, uids)
+        return await _run_imap(self._mark_seen_many_sync, uids)
+
+    async def close(self) -> None:
+        """Log out of the cached connection (if any)."""
+        await _run_imap(self._close_sync)
 
     async def debug_mailbox(self, from_email: str, sample: int = 10) -> dict:
         """
@@ -46,65 +92,116 @@ class ImapClient:
         - counts ALL/UNSEEN and UNSEEN FROM-filter
         - fetches headers+flags for a few latest messages
         """
-        return await asyncio.to_thread(self._debug_mailbox_sync, from_email, sample)
+        return await _run_imap(self._debug_mailbox_sync, from_email, sample)
 
-    def _fetch_from_sync(self, from_email: str, limit: int, unseen_only: bool) -> list[ImapMessage]:
+    def _get_conn(self) -> imaplib.IMAP4_SSL:
+        # Caller holds _conn_lock.
+        imap = self._imap
+        if imap is not None and time.monotonic() - self._last_used < _IMAP_REUSE_IDLE_SECONDS:
+            try:
+                if imap.noop()[0] == "OK":
+                    return imap
+            except Exception:
+                pass
+        self._drop_conn()
         imap = imaplib.IMAP4_SSL(self.host, self.port)
         try:
             imap.login(self.username, self.password)
             imap.select(self.mailbox)
-
-            criteria = f'(FROM "{from_email}")'
-            if unseen_only:
-                criteria = f'(UNSEEN FROM "{from_email}")'
-
-            typ, data = imap.uid("SEARCH", None, criteria)
-            if typ != "OK" or not data or not data[0]:
-                return []
-            uids = data[0].split()
-            # берем последние limit
-            uids = uids[-limit:]
-
-            out: list[ImapMessage] = []
-            for uid_b in uids:
-                uid = uid_b.decode("utf-8", errors="ignore")
-                # BODY.PEEK[] does NOT set \\Seen flag (important for UNSEEN-based polling)
-                typ2, msg_data = imap.uid("FETCH", uid_b, "(BODY.PEEK[])")
-                if typ2 != "OK" or not msg_data:
-                    continue
-                # msg_data: [(b'UID ... RFC822 {bytes}', raw_bytes), b')']
-                raw = None
-                for item in msg_data:
-                    if isinstance(item, tuple) and len(item) == 2:
-                        raw = item[1]
-                        break
-                if raw:
-                    out.append(ImapMessage(uid=uid, raw=raw))
-            return out
-        finally:
+        except Exception:
             try:
                 imap.logout()
             except Exception:
                 pass
+            raise
+        self._imap = imap
+        return imap
 
-    def _mark_seen_many_sync(self, uids: list[str]) -> int:
-        imap = imaplib.IMAP4_SSL(self.host, self.port)
-        try:
-            imap.login(self.username, self.password)
-            imap.select(self.mailbox)
-            for uid in uids:
-                try:
-                    imap.uid("STORE", uid, "+FLAGS.SILENT", "(\\Seen)")
-                except Exception:
-                    # best-effort; do not break ack batch
-                    continue
-            return len(uids)
-        finally:
+    def _drop_conn(self) -> None:
+        imap, self._imap = self._imap, None
+        if imap is not None:
             try:
                 imap.logout()
             except Exception:
                 pass
 
+    def _close_sync(self) -> None:
+        with self._conn_lock:
+            self._drop_conn()
+
+    def _fetch_from_sync(self, from_email: str, limit: int, unseen_only: bool) -> list[ImapMessage]:
+        with self._conn_lock:
+            imap = self._get_conn()
+            try:
+                out = self._fetch_from_conn(imap, from_email, limit, unseen_only)
+            except Exception:
+                # broken/aborted session: reconnect next time
+                self._drop_conn()
+                raise
+            self._last_used = time.monotonic()
+            return out
+
+    def _fetch_from_conn(
+        self, imap: imaplib.IMAP4_SSL, from_email: str, limit: int, unseen_only: bool
+    ) -> list[ImapMessage]:
+        criteria = f'(FROM "{from_email}")'
+        if unseen_only:
+            criteria = f'(UNSEEN FROM "{from_email}")'
+
+        typ, data = imap.uid("SEARCH", None, criteria)
+        if typ != "OK" or not data or not data[0]:
+            return []
+        uids = data[0].split()
+        # берем последние limit
+        uids = uids[-limit:]
+
+        raw_by_uid: dict[bytes, bytes] = {}
+        for i in range(0, len(uids), _FETCH_BATCH):
+            batch = uids[i : i + _FETCH_BATCH]
+            # BODY.PEEK[] does NOT set \\Seen flag (important for UNSEEN-based polling)
+            typ2, msg_data = imap.uid("FETCH", b",".join(batch), "(BODY.PEEK[])")
+            if typ2 != "OK" or not msg_data:
+                continue
+            # msg_data: [(b'1 (UID 123 BODY[] {bytes}', raw_bytes), b')', ...]
+            for uid_b, _meta, raw in _split_fetch_response(msg_data):
+                if uid_b and raw:
+                    raw_by_uid[uid_b] = raw
+        # keep SEARCH (ascending UID) order
+        return [
+            ImapMessage(uid=uid_b.decode("utf-8", errors="ignore"), raw=raw_by_uid[uid_b])
+            for uid_b in uids
+            if uid_b in raw_by_uid
+        ]
+
+    def _mark_seen_many_sync(self, uids: list[str]) -> int:
+        with self._conn_lock:
+            imap = self._get_conn()
+            try:
+                for i in range(0, len(uids), _STORE_BATCH):
+                    batch = uids[i : i + _STORE_BATCH]
+                    try:
+                        typ, _ = imap.uid("STORE", ",".join(batch), "+FLAGS.SILENT", "(\\Seen)")
+                        if typ == "OK":
+                            continue
+                    except imaplib.IMAP4.abort:
+                        raise
+                    except Exception:
+                        pass
+                    # Batch rejected (e.g. one expunged UID on a strict server): retry this batch per UID.
+                    for uid in batch:
+                        try:
+                            imap.uid("STORE", uid, "+FLAGS.SILENT", "(\\Seen)")
+                        except imaplib.IMAP4.abort:
+                            raise
+                        except Exception:
+                            # best-effort; do not break ack batch
+                            continue
+            except Exception:
+                self._drop_conn()
+                raise
+            self._last_used = time.monotonic()
+            return len(uids)
+
     def _debug_mailbox_sync(self, from_email: str, sample: int) -> dict:
         imap = imaplib.IMAP4_SSL(self.host, self.port)
         try:
@@ -145,22 +242,25 @@ class ImapClient:
             # Fetch a few latest headers/flags to see real From and flags
             latest = all_uids[-sample:] if sample and all_uids else []
             samples = []
-            for uid in latest:
-                t, d = imap.uid("FETCH", uid.encode("utf-8"), "(FLAGS BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])")
-                if t != "OK" or not d:
-                    continue
-                flags = None
-                header = ""
-                for item in d:
-                    if isinstance(item, tuple) and len(item) == 2:
-                        header = item[1].decode("utf-8", errors="replace")
-                        # flags are in item[0] bytes, try to show them
-                        try:
-                            flags = item[0].decode("utf-8", errors="ignore")
-                        except Exception:
-                            flags = str(item[0])
-                        break
-                samples.append({"uid": uid, "flags_line": flags, "header": header.strip()})
+            if latest:
+                t, d = imap.uid(
+                    "FETCH",
+                    ",".join(latest).encode("utf-8"),
+                    "(FLAGS BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])",
+                )
+                by_uid: dict[str, tuple[bytes, bytes]] = {}
+                if t == "OK" and d:
+                    for uid_b, meta, header_b in _split_fetch_response(d):
+                        if uid_b:
+                            by_uid[uid_b.decode("utf-8", errors="ignore")] = (meta, header_b)
+                for uid in latest:
+                    if uid not in by_uid:
+                        continue
+                    meta, header_b = by_uid[uid]
+                    # flags are in the response head bytes, try to show them
+                    flags = meta.decode("utf-8", errors="ignore")
+                    header = header_b.decode("utf-8", errors="replace")
+                    samples.append({"uid": uid, "flags_line": flags, "header": header.strip()})
 
             return {
                 "host": self.host,
@@ -25,6 +25,13 @@ class RiskLevel(str, Enum):
     INFO = "INFO"
 
 
+# "(GMT+03:00)" -> "+03:00"
+_GMT_RE = re.compile(r"\(\s*GMT([+-]\d{2}:\d{2})\s*\)", re.IGNORECASE)
+# Kaspersky notification format after _GMT_RE: "Tuesday, January 27, 2026 7:14:20 AM +00:00"
+_KASP_TIME_FMT = "%A, %B %d, %Y %I:%M:%S %p %z"
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
 class KasperskyEvent(BaseModel):
     vendor_severity: str | None = None
     device: str | None = None
@@ -43,7 +50,7 @@ class KasperskyEvent(BaseModel):
         if not v:
             return v
         vv = v.strip().lower()
-        if len(vv) == 64 and all(c in "0123456789abcdef" for c in vv):
+        if len(vv) == 64 and _HEX_DIGITS.issuperset(vv):
             return vv
         return v.strip()
 
@@ -57,8 +64,12 @@ class KasperskyEvent(BaseModel):
         else:
             s = str(v).strip()
             # Example: "Tuesday, January 27, 2026 7:14:20 AM (GMT+00:00)"
-            s = re.sub(r"\(\s*GMT([+-]\d{2}:\d{2})\s*\)", r"\1", s, flags=re.IGNORECASE)
-            dt = dtparser.parse(s)
+            s = _GMT_RE.sub(r"\1", s)
+            try:
+                # C strptime for the known shape; dateutil only for anything else
+                dt = datetime.strptime(s, _KASP_TIME_FMT)
+            except ValueError:
+                dt = dtparser.parse(s)
         if dt.tzinfo is None:
             # Если в письме нет TZ, считаем что это уже UTC (лучше чем "локаль" сервера)
             return dt.replace(tzinfo=UTC)
@@ -68,15 +79,16 @@ class KasperskyEvent(BaseModel):
         """
         Fingerprint для дедупликации: device + event_type + detection_name + object + result
         """
-        parts = [
-            (self.device or "").strip().lower(),
-            (self.event_type or "").strip().lower(),
-            (self.detection_name or "").strip().lower(),
-            (self.object_path or "").strip().lower(),
-            (self.result or "").strip().lower(),
-        ]
-        data = "|".join(parts).encode("utf-8", errors="ignore")
-        return hashlib.sha256(data).hexdigest()
+        # Streams the parts into the hash; digest is identical to sha256("|".join(parts).encode()),
+        # so fingerprints stored before this change still match. str.lower() (not ASCII-only) on purpose:
+        # device/detection names may be Cyrillic.
+        h = hashlib.sha256()
+        for i, part in enumerate((self.device, self.event_type, self.detection_name, self.object_path, self.result)):
+            if i:
+                h.update(b"|")
+            if part:
+                h.update(part.strip().lower().encode("utf-8", errors="ignore"))
+        return h.hexdigest()
 
 
 class ParsedEmail(BaseModel):
@@ -100,4 +112,6 @@ class DispatchMessage(BaseModel):
     text: str
     email_id: int
     risk_level: RiskLevel
+    # Short error token when LLM enrichment failed and rules text was used (e.g. "APIConnectionError").
+    llm_fallback: str | None = None
 
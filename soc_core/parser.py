@@ -10,11 +10,34 @@ from bs4 import BeautifulSoup
 
 from soc_core.models import KasperskyEvent, ParsedEmail
 
-
-_KV_RE = re.compile(r"^\s*([^:\n]{2,80})\s*:\s*(.*?)\s*$")
+try:
+    import lxml  # type: ignore  # noqa: F401
+
+    # optional speedup: C parser for BeautifulSoup; html.parser (pure Python) otherwise
+    _BS_FEATURES = "lxml"
+except Exception:
+    _BS_FEATURES = "html.parser"
+
+
+# Scanned over the whole text (MULTILINE) instead of per splitlines() line; [^\S\n] is "\s without newline"
+# so a match never runs into the next line. _LINE_BREAKS maps the other splitlines() separators to "\n".
+_KV_RE = re.compile(r"^[^\S\n]*([^:\n]{2,80})[^\S\n]*:[^\S\n]*(.*?)[^\S\n]*$", re.MULTILINE)
+_LINE_BREAKS = str.maketrans(dict.fromkeys("\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029", "\n"))
+# Lower-cased stream keys for _pick_first()/_all().
+_KEYS_NAME = ("название", "name")
+_KEYS_EVENT_TYPE = ("тип события", "event type", "event", "тип")
+_KEYS_OBJECT = ("объект", "object", "object path", "file", "path")
+_KEYS_USER = ("пользователь", "user", "account")
+_KEYS_RESULT = ("описание результата", "result", "action", "status", "результат")
+_KEYS_EVENT_TIME = ("дата и время события", "event time", "time", "date", "дата/время", "время события")
 _DEVICE_RE = re.compile(r"произошло на устройстве\s+([A-Za-z0-9_.-]+)", re.IGNORECASE)
 _VENDOR_SEV_RE = re.compile(r"произошло\s+(\w+)\s+событие", re.IGNORECASE)
 _EVENT_QUOTED_RE = re.compile(r'событие\s+"([^"]+)"', re.IGNORECASE)
+# Searched, not end-anchored: names may carry a suffix after the file name ("svchost.exe (PID 42)").
+_PROCESS_EXT_RE = re.compile(r"\.(exe|dll|sys|bat|ps1)\b")
+_BINARY_EXT_RE = re.compile(r"\.(exe|dll|sys)\b")
+_DETECTION_PREFIXES = ("heur:", "trojan.", "trojan:", "not-a-virus:", "virus.", "worm.", "exploit.")
+_SHA256_RE = re.compile(r"\b[a-fA-F0-9]{64}\b")
 
 
 def _extract_best_body(msg) -> tuple[str, str]:
@@ -23,13 +46,14 @@ def _extract_best_body(msg) -> tuple[str, str]:
     Prefers HTML because Kaspersky письма часто табличные/HTML.
     """
     if msg.is_multipart():
-        parts = list(msg.walk())
         html_part = None
         text_part = None
-        for p in parts:
+        for p in msg.walk():
             ctype = p.get_content_type()
-            if ctype == "text/html" and html_part is None:
+            if ctype == "text/html":
+                # HTML wins anyway; don't walk the remaining parts (attachments, images)
                 html_part = p
+                break
             if ctype == "text/plain" and text_part is None:
                 text_part = p
         chosen = html_part or text_part
@@ -44,7 +68,7 @@ def _extract_best_body(msg) -> tuple[str, str]:
 
 
 def _html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, _BS_FEATURES)
     for tag in soup(["script", "style"]):
         tag.decompose()
     text = soup.get_text("\n")
@@ -65,24 +89,26 @@ def _guess_date(header_date: str | None) -> datetime | None:
         return None
 
 
-def _parse_key_values(text: str) -> dict[str, str]:
-    # Backward-compat helper (keeps first occurrence).
+def _first_values(stream: list[tuple[str, str]]) -> dict[str, str]:
+    # Legacy dict view of the stream (keeps first occurrence).
     kv: dict[str, str] = {}
-    for k, v in _parse_kv_stream(text):
+    for k, v in stream:
         if k not in kv:
             kv[k] = v
     return kv
 
 
+def _parse_key_values(text: str) -> dict[str, str]:
+    # Backward-compat helper.
+    return _first_values(_parse_kv_stream(text))
+
+
 def _parse_kv_stream(text: str) -> list[tuple[str, str]]:
     """
     Preserves order and duplicates (важно: "Название:" бывает и для процесса, и для угрозы).
     """
     out: list[tuple[str, str]] = []
-    for line in text.splitlines():
-        m = _KV_RE.match(line)
-        if not m:
-            continue
+    for m in _KV_RE.finditer(text.translate(_LINE_BREAKS)):
         key = m.group(1).strip().lower()
         val = m.group(2).strip()
         if key and val:
@@ -98,17 +124,54 @@ def _pick(kv: dict[str, str], *keys: str) -> str | None:
     return None
 
 
-def _pick_first(stream: list[tuple[str, str]], *keys: str) -> str | None:
-    keyset = {k.strip().lower() for k in keys}
-    for k, v in stream:
-        if k in keyset and v:
-            return v
-    return None
+def _index_stream(stream: list[tuple[str, str]]) -> dict[str, list[tuple[int, str]]]:
+    # key -> [(position in stream, value)], so lookups below don't rescan the whole stream per call
+    idx: dict[str, list[tuple[int, str]]] = {}
+    for i, (k, v) in enumerate(stream):
+        idx.setdefault(k, []).append((i, v))
+    return idx
 
 
-def _all(stream: list[tuple[str, str]], *keys: str) -> list[str]:
-    keyset = {k.strip().lower() for k in keys}
-    return [v for k, v in stream if k in keyset and v]
+def _parse_kv_index(text: str) -> dict[str, list[tuple[int, str]]]:
+    """
+    Same result as _index_stream(_parse_kv_stream(text)), built during the line scan
+    without materializing the intermediate (key, value) list.
+    """
+    idx: dict[str, list[tuple[int, str]]] = {}
+    i = 0
+    for m in _KV_RE.finditer(text.translate(_LINE_BREAKS)):
+        key = m.group(1).strip().lower()
+        val = m.group(2).strip()
+        if key and val:
+            hits = idx.get(key)
+            if hits is None:
+                idx[key] = [(i, val)]
+            else:
+                hits.append((i, val))
+            i += 1
+    return idx
+
+
+def _first_values_from_index(idx: dict[str, list[tuple[int, str]]]) -> dict[str, str]:
+    # Same dict as _first_values(stream): first occurrence per key.
+    return {k: hits[0][1] for k, hits in idx.items()}
+
+
+def _pick_first(idx: dict[str, list[tuple[int, str]]], keys: tuple[str, ...]) -> str | None:
+    # Earliest value in stream order among any of `keys` (not "first key wins"). Keys must be lower-case.
+    best: tuple[int, str] | None = None
+    for k in keys:
+        hits = idx.get(k)
+        if hits and (best is None or hits[0][0] < best[0]):
+            best = hits[0]
+    return best[1] if best else None
+
+
+def _all(idx: dict[str, list[tuple[int, str]]], keys: tuple[str, ...]) -> list[str]:
+    # All values for `keys`, in stream order. Keys must be lower-case.
+    hits = [h for k in keys for h in idx.get(k, ())]
+    hits.sort()
+    return [v for _, v in hits]
 
 
 def _select_process_and_detection(names: list[str]) -> tuple[str | None, str | None]:
@@ -122,20 +185,19 @@ def _select_process_and_detection(names: list[str]) -> tuple[str | None, str | N
 
     for n in names:
         nn = n.strip()
-        low = nn.lower()
-        if process is None and re.search(r"\.(exe|dll|sys|bat|ps1)\b", low):
+        if _PROCESS_EXT_RE.search(nn.lower()):
             process = nn
+            break
 
     for n in names:
         nn = n.strip()
         low = nn.lower()
-        if detection is not None:
-            continue
-        if any(low.startswith(p) for p in ("heur:", "trojan.", "trojan:", "not-a-virus:", "virus.", "worm.", "exploit.")):
+        if low.startswith(_DETECTION_PREFIXES):
             detection = nn
-            continue
-        if ":" in nn and not re.search(r"\.(exe|dll|sys)\b", low):
+            break
+        if ":" in nn and not _BINARY_EXT_RE.search(low):
             detection = nn
+            break
 
     # fallback: если нет процесса — единственное имя считать детектом
     if detection is None and process is None and names:
@@ -144,8 +206,7 @@ def _select_process_and_detection(names: list[str]) -> tuple[str | None, str | N
     # если нашли только exe и ничего похожего на сигнатуру — детектом считать последний non-exe (если есть)
     if detection is None and names:
         for n in reversed(names):
-            low = n.lower()
-            if not re.search(r"\.(exe|dll|sys)\b", low):
+            if not _BINARY_EXT_RE.search(n.lower()):
                 detection = n.strip()
                 break
 
@@ -157,8 +218,11 @@ class KasperskyEmailParser:
     Детерминированный слой: email bytes -> ParsedEmail -> KasperskyEvent
     """
 
+    # BytesParser keeps no per-message state; one instance serves every parse() call.
+    _bytes_parser = BytesParser(policy=policy.default)
+
     def parse(self, uid: str, raw_email: bytes) -> ParsedEmail:
-        msg = BytesParser(policy=policy.default).parsebytes(raw_email)
+        msg = self._bytes_parser.parsebytes(raw_email)
 
         subject = str(msg.get("Subject", "")).strip() or None
         from_email = str(msg.get("From", "")).strip() or None
@@ -169,8 +233,8 @@ class KasperskyEmailParser:
         ctype, body = _extract_best_body(msg)
         raw_text = _html_to_text(body) if ctype == "text/html" else body.strip()
 
-        stream = _parse_kv_stream(raw_text)
-        kv = _parse_key_values(raw_text)  # legacy dict (first occurrences)
+        idx = _parse_kv_index(raw_text)
+        kv = _first_values_from_index(idx)  # legacy dict (first occurrences); no second line/regex pass
 
         # vendor severity обычно в subject/body: "Произошло Warning/Critical событие ..."
         vendor_severity = None
@@ -187,21 +251,21 @@ class KasperskyEmailParser:
                 device = mdev.group(1).strip()
 
         # "Название:" встречается дважды: процесс и имя угрозы
-        names = _all(stream, "название", "name")
+        names = _all(idx, _KEYS_NAME)
         process_name, detection_name = _select_process_and_detection(names)
 
         event = KasperskyEvent(
             vendor_severity=vendor_severity or _pick(kv, "severity", "vendor severity", "уровень опасности"),
             device=device,
-            event_type=_pick_first(stream, "тип события", "event type", "event", "тип")
+            event_type=_pick_first(idx, _KEYS_EVENT_TYPE)
             or _pick(kv, "event type", "тип события"),
             detection_name=detection_name or _pick(kv, "detection name", "threat name", "malware name", "название угрозы"),
-            object_path=_pick_first(stream, "объект", "object", "object path", "file", "path"),
+            object_path=_pick_first(idx, _KEYS_OBJECT),
             process_name=process_name or _pick(kv, "process", "process name", "процесс"),
             sha256=_pick(kv, "sha256", "sha-256", "hash", "хеш"),
-            user=_pick_first(stream, "пользователь", "user", "account"),
-            result=_pick_first(stream, "описание результата", "result", "action", "status", "результат"),
-            event_time=_pick_first(stream, "дата и время события", "event time", "time", "date", "дата/время", "время события")
+            user=_pick_first(idx, _KEYS_USER),
+            result=_pick_first(idx, _KEYS_RESULT),
+            event_time=_pick_first(idx, _KEYS_EVENT_TIME)
             or date,
         )
 
@@ -213,7 +277,7 @@ class KasperskyEmailParser:
 
         # если внутри письма ключей мало — попробуем fallback regexp по всему тексту
         if event.sha256 is None:
-            m = re.search(r"\b[a-fA-F0-9]{64}\b", raw_text)
+            m = _SHA256_RE.search(raw_text)
             if m:
                 event.sha256 = m.group(0).lower()
 
@@ -1,18 +1,20 @@
 from __future__ import annotations
 
+import functools
+import stat
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AgentPrompt:
     role: str
     goal: str
     backstory: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TaskPrompts:
     soc_analysis_suffix: str
     threat_research_suffix: str
@@ -22,7 +24,7 @@ class TaskPrompts:
     expected_output_dispatcher: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Prompts:
     analyst: AgentPrompt
     researcher: AgentPrompt
@@ -30,7 +32,9 @@ class Prompts:
     tasks: TaskPrompts
 
 
+@functools.cache
 def default_prompts() -> Prompts:
+    # Prompts are frozen dataclasses, so one shared instance is safe.
     return Prompts(
         analyst=AgentPrompt(
             role="Security Analyst (SOC Expert)",
@@ -82,6 +86,7 @@ def default_prompts() -> Prompts:
     )
 
 
+@functools.cache
 def _package_default_path() -> Path:
     return Path(__file__).with_name("prompts.yaml")
 
@@ -89,11 +94,21 @@ def _package_default_path() -> Path:
 def load_prompts(path: str | None) -> Prompts:
     """
     Loads prompts from YAML file. If file is missing/invalid, returns defaults.
+    Parsed prompts are cached per (path, mtime, size), so edits to the YAML are still picked up
+    while the warm path is a single stat().
     """
     p = Path(path) if path else _package_default_path()
-    if not p.exists() or not p.is_file():
+    try:
+        st = p.stat()
+    except OSError:
+        return default_prompts()
+    if not stat.S_ISREG(st.st_mode):
         return default_prompts()
+    return _load_prompts_cached(str(p), st.st_mtime_ns, st.st_size)
+
 
+@functools.lru_cache(maxsize=4)
+def _load_prompts_cached(path: str, mtime_ns: int, size: int) -> Prompts:
     try:
         import yaml  # type: ignore
     except Exception:
@@ -101,7 +116,10 @@ def load_prompts(path: str | None) -> Prompts:
         return default_prompts()
 
     try:
-        data = yaml.safe_load(p.read_text(encoding="utf-8")) or {}
+        # libyaml-backed loader when PyYAML was built with it; bytes go straight to the C parser (UTF-8 by default).
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        with open(path, "rb") as f:
+            data = yaml.load(f, Loader=loader) or {}
     except Exception:
         return default_prompts()
 
@@ -1,22 +1,132 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import random
+import re
+import time
 from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
 
 from soc_core.database import Database
 from soc_core.models import AssetType, DispatchMessage, EnrichedEvent, KasperskyEvent, RiskLevel
 
 
+# LLM retries on transient errors: exponential backoff with jitter (so alerts that failed together
+# don't retry in lockstep), capped per sleep and by a wall-clock budget for the whole LLM step.
+_LLM_MAX_ATTEMPTS = 3
+_LLM_BACKOFF_BASE_SECONDS = 1.0
+_LLM_BACKOFF_MAX_SECONDS = 8.0
+_LLM_BACKOFF_JITTER_SECONDS = 1.0
+# Upper bound for one llm_runner call (web searches + the whole CrewAI run), so a hung socket cannot
+# stall the alert forever. Hitting it is final for the alert: the CrewAI kickoff thread behind it cannot
+# be cancelled and keeps running (agents.py caps how many may), so a retry would only start a second crew.
+_LLM_ATTEMPT_TIMEOUT_SECONDS = 120.0
+_LLM_RETRY_BUDGET_SECONDS = _LLM_MAX_ATTEMPTS * _LLM_ATTEMPT_TIMEOUT_SECONDS
+
+
+class _CircuitBreaker:
+    """
+    Skips the LLM for `cooldown_seconds` after `fail_threshold` alerts in a row ended in a transient
+    LLM error, so an outage costs each alert ~0s instead of the full retry budget. After the cool-down
+    calls go through again; the first success closes the breaker, another failure re-opens it.
+    """
+
+    def __init__(self, fail_threshold: int, cooldown_seconds: float):
+        self.fail_threshold = fail_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown_seconds
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.fail_threshold:
+            self.opened_at = time.monotonic()
+
+
+# One provider per process; llm_runner is a per-alert closure, so state can't be keyed by it.
+_llm_breaker = _CircuitBreaker(fail_threshold=5, cooldown_seconds=30.0)
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit, server errors, provider overloaded (529).
+_RETRYABLE_LLM_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+
+@functools.cache
+def _retryable_llm_exc_types() -> tuple[type[BaseException], ...]:
+    # Resolved on first failure: openai is only imported together with CrewAI (litellm errors subclass these).
+    types: tuple[type[BaseException], ...] = (ConnectionError, TimeoutError)
+    try:
+        import openai  # type: ignore
+
+        types += (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+    except Exception:
+        pass
+    return types
+
+
+def _is_retryable_llm_error(e: Exception) -> bool:
+    if isinstance(e, _retryable_llm_exc_types()):
+        return True
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    if status in _RETRYABLE_LLM_STATUS:
+        return True
+    # Last resort for wrappers that re-raise under their own types: transient connection/timeouts by name.
+    name = type(e).__name__
+    msg = str(e)
+    return (
+        "APIConnectionError" in name
+        or "APIConnectionError" in msg
+        or "ConnectionError" in name
+        or "ConnectError" in name
+        or "Timeout" in name
+        or "timed out" in msg.lower()
+    )
+
+
+def _retry_after_seconds(e: Exception) -> float | None:
+    """Server-requested wait from a Retry-After header on the error's HTTP response (seconds or HTTP-date)."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        value = headers.get("retry-after")
+    except Exception:
+        return None
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except Exception:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    return max((when - datetime.now(UTC)).total_seconds(), 0.0)
+
+
+_SEVERITY_RANKS = {"critical": 3, "high": 3, "medium": 2, "moderate": 2, "low": 1}
+# Substring keywords that escalate to CRITICAL, per field.
+_CRITICAL_EVENT_TYPE_RE = re.compile("ransomware|malware|exploit")
+_CRITICAL_DETECTION_RE = re.compile("ransomware|exploit")
+
+
 def _severity_rank(vendor_severity: str | None) -> int:
     if not vendor_severity:
         return 0
-    s = vendor_severity.strip().lower()
-    if s in {"critical", "high"}:
-        return 3
-    if s in {"medium", "moderate"}:
-        return 2
-    if s in {"low"}:
-        return 1
-    return 0
+    return _SEVERITY_RANKS.get(vendor_severity.strip().lower(), 0)
 
 
 def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> EnrichedEvent:
@@ -24,9 +134,7 @@ def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> En
     dn = (event.detection_name or "").lower()
 
     # 1) Ransomware/Malware/Exploit => CRITICAL
-    if any(x in et for x in ("ransomware", "malware", "exploit")) or any(
-        x in dn for x in ("ransomware", "exploit")
-    ):
+    if _CRITICAL_EVENT_TYPE_RE.search(et) or _CRITICAL_DETECTION_RE.search(dn):
         return EnrichedEvent(
             event=event,
             asset_type=asset_type,
@@ -34,8 +142,10 @@ def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> En
             risk_reason="Threat category escalated to CRITICAL (rules)",
         )
 
+    sev = _severity_rank(event.vendor_severity)
+
     # 2) SERVER + vendor Medium+ => HIGH + note
-    if asset_type == AssetType.SERVER and _severity_rank(event.vendor_severity) >= 2:
+    if asset_type == AssetType.SERVER and sev >= 2:
         return EnrichedEvent(
             event=event,
             asset_type=asset_type,
@@ -48,7 +158,6 @@ def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> En
     # - Medium: bump to HIGH (without "Critical Asset Involved" wording).
     # - Low/Info: keep scale, but add note to classify.
     if asset_type == AssetType.UNCLASSIFIED:
-        sev = _severity_rank(event.vendor_severity)
         if sev >= 3:
             return EnrichedEvent(
                 event=event,
@@ -65,7 +174,6 @@ def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> En
             )
 
     # 3) Standard scale
-    sev = _severity_rank(event.vendor_severity)
     if sev >= 3:
         rl = RiskLevel.HIGH
     elif sev == 2:
@@ -81,18 +189,22 @@ def enrich_with_rules(event: KasperskyEvent, asset_type: AssetType | None) -> En
     return EnrichedEvent(event=event, asset_type=asset_type, risk_level=rl, risk_reason=reason)
 
 
+_RISK_ICONS: dict[RiskLevel, str] = {
+    RiskLevel.CRITICAL: "🔴",
+    RiskLevel.HIGH: "🔴",
+    RiskLevel.MEDIUM: "🟡",
+    RiskLevel.LOW: "🟢",
+    RiskLevel.INFO: "🟢",
+}
+
+
 def format_rules_summary(enriched: EnrichedEvent, repeats: int) -> str:
     ev = enriched.event
-    icon = {
-        RiskLevel.CRITICAL: "🔴",
-        RiskLevel.HIGH: "🔴",
-        RiskLevel.MEDIUM: "🟡",
-        RiskLevel.LOW: "🟢",
-        RiskLevel.INFO: "🟢",
-    }[enriched.risk_level]
-
-    lines: list[str] = []
-    lines.append(f"{icon} | {enriched.risk_level.value} | {(ev.event_type or 'Event').strip()} | {(ev.device or 'unknown').strip()}")
+    icon = _RISK_ICONS.get(enriched.risk_level, "⚪")
+
+    lines = [
+        f"{icon} | {enriched.risk_level.value} | {(ev.event_type or 'Event').strip()} | {(ev.device or 'unknown').strip()}"
+    ]
     if enriched.asset_type:
         lines.append(f"Asset: {enriched.asset_type.value}")
     if enriched.risk_reason:
@@ -123,48 +235,61 @@ async def build_dispatch_message(
     asset_type = await db.get_asset_type(event.device)
     enriched = enrich_with_rules(event, asset_type)
 
-    def _is_retryable_llm_error(e: Exception) -> bool:
-        name = type(e).__name__
-        msg = str(e)
-        # We only retry on connection/timeouts (transient).
-        return (
-            "APIConnectionError" in name
-            or "APIConnectionError" in msg
-            or "ConnectionError" in name
-            or "ConnectError" in name
-            or "Timeout" in name
-            or "ReadTimeout" in name
-            or "timed out" in msg.lower()
-        )
-
     text: str
-    if enable_llm and llm_runner is not None:
+    llm_fallback: str | None = None
+    if enable_llm and llm_runner is not None and _llm_breaker.is_open():
+        llm_fallback = "CircuitOpen"
+        text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {llm_fallback}"
+    elif enable_llm and llm_runner is not None:
         servers = await db.list_servers()
         last_err: Exception | None = None
-        # Retry only for transient connection issues (2–3 attempts total).
-        for attempt in range(3):
+        started = time.monotonic()
+        # Retry only for transient connection issues, within the attempt and wall-clock budgets.
+        for attempt in range(_LLM_MAX_ATTEMPTS):
+            deadline = asyncio.timeout(_LLM_ATTEMPT_TIMEOUT_SECONDS)
             try:
-                text = await llm_runner(event=event, enriched=enriched, servers=servers, repeats=repeats)
+                async with deadline:
+                    text = await llm_runner(event=event, enriched=enriched, servers=servers, repeats=repeats)
                 last_err = None
+                _llm_breaker.record_success()
                 break
             except Exception as e:
                 last_err = e
-                if _is_retryable_llm_error(e) and attempt < 2:
-                    # simple exponential backoff: 1s, 2s
-                    import asyncio
-
-                    await asyncio.sleep(1 * (2**attempt))
-                    continue
-                text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {type(e).__name__}"
+                if deadline.expired():
+                    # Our own per-attempt limit (slow, not failing, provider): the orphaned kickoff is still
+                    # running, so no retry and no breaker failure; fall back to rules for this alert.
+                    llm_fallback = type(e).__name__
+                    text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {llm_fallback}"
+                    break
+                if _is_retryable_llm_error(e) and attempt < _LLM_MAX_ATTEMPTS - 1:
+                    delay = min(_LLM_BACKOFF_BASE_SECONDS * (2**attempt), _LLM_BACKOFF_MAX_SECONDS)
+                    # Retry-After is a lower bound (retrying sooner just hits the same limit);
+                    # the wall-clock budget below still applies.
+                    delay = max(delay, _retry_after_seconds(e) or 0.0)
+                    delay += random.uniform(0, _LLM_BACKOFF_JITTER_SECONDS)
+                    if time.monotonic() - started + delay < _LLM_RETRY_BUDGET_SECONDS:
+                        await asyncio.sleep(delay)
+                        continue
+                if _is_retryable_llm_error(e):
+                    # provider-side trouble (not a per-event error): counts towards opening the breaker
+                    _llm_breaker.record_failure()
+                llm_fallback = type(e).__name__
+                text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {llm_fallback}"
                 break
         else:
             # Should not happen, but keep rules-first safety net.
             if last_err is not None:
-                text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {type(last_err).__name__}"
+                llm_fallback = type(last_err).__name__
+                text = format_rules_summary(enriched, repeats) + f"\nLLM fallback: {llm_fallback}"
             else:
                 text = format_rules_summary(enriched, repeats)
     else:
         text = format_rules_summary(enriched, repeats)
 
-    return DispatchMessage(text=text, email_id=email_id, risk_level=enriched.risk_level)
+    return DispatchMessage(
+        text=text,
+        email_id=email_id,
+        risk_level=enriched.risk_level,
+        llm_fallback=llm_fallback[:128] if llm_fallback else None,
+    )
 
@@ -1,35 +1,158 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    # optional speedup; falls back to Response.json()
+    orjson = None
+
+
+# (provider, query, n) -> (stored_at_monotonic, hits).
+# Alert storms repeat the same detection_name across hosts; these are paid, slow APIs.
+_SEARCH_CACHE_TTL_SECONDS = 1800
+_SEARCH_CACHE_MAX = 512
+_search_cache: OrderedDict[tuple[str, str, int], tuple[float, list[dict]]] = OrderedDict()
+# searches run in worker threads (asyncio.to_thread)
+_search_cache_lock = threading.Lock()
+# key -> set when the in-flight upstream request for it finishes (single-flight).
+_inflight: dict[tuple[str, str, int], threading.Event] = {}
+
+
+def _cache_get_locked(key: tuple[str, str, int]) -> list[dict] | None:
+    # Caller holds _search_cache_lock.
+    item = _search_cache.get(key)
+    if item is None:
+        return None
+    stored_at, hits = item
+    if time.monotonic() - stored_at > _SEARCH_CACHE_TTL_SECONDS:
+        del _search_cache[key]
+        return None
+    _search_cache.move_to_end(key)
+    return hits
+
+
+def _cache_put(key: tuple[str, str, int], hits: list[dict]) -> None:
+    with _search_cache_lock:
+        _search_cache[key] = (time.monotonic(), hits)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > _SEARCH_CACHE_MAX:
+            _search_cache.popitem(last=False)
+
+
+def _cached_search(provider: str, query: str, n: int, fetch: Callable[[], list[dict]]) -> list[dict]:
+    """
+    TTL-cached, single-flight search: concurrent calls for the same (provider, query, n) wait for
+    one upstream request instead of each paying for it. Failures are not cached; a waiter whose
+    leader failed retries on its own.
+    """
+    key = (provider, query.strip().lower(), n)
+    while True:
+        with _search_cache_lock:
+            hits = _cache_get_locked(key)
+            if hits is not None:
+                return hits
+            done = _inflight.get(key)
+            if done is None:
+                done = _inflight[key] = threading.Event()
+                break
+        done.wait()
+    try:
+        hits = fetch()
+        _cache_put(key, hits)
+        return hits
+    finally:
+        with _search_cache_lock:
+            _inflight.pop(key, None)
+        done.set()
+
+
+def clear_search_cache() -> None:
+    with _search_cache_lock:
+        _search_cache.clear()
+
+
+def _response_json(r: requests.Response) -> dict:
+    # Serper/Tavily always answer in UTF-8 JSON, so orjson can parse the raw bytes directly.
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+
+# Keep-alive connections to Serper/Tavily shared by all WebTools instances (created on first use).
+_SESSION: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _shared_session() -> requests.Session:
+    global _SESSION
+    with _session_lock:
+        if _SESSION is None:
+            s = requests.Session()
+            # Up to 6 searches per alert run in parallel threads, for several alerts at once.
+            # Transient 429/5xx and connect errors get two quick retries (searches are idempotent POSTs);
+            # Retry-After is not honored here so a throttled provider cannot stall alert enrichment.
+            retry = Retry(
+                total=2,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            )
+            s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+            _SESSION = s
+        return _SESSION
 
 
 class WebTools:
-    def __init__(self, serper_api_key: str | None = None, tavily_api_key: str | None = None):
+    def __init__(
+        self,
+        serper_api_key: str | None = None,
+        tavily_api_key: str | None = None,
+        session: requests.Session | None = None,
+    ):
         self.serper_api_key = serper_api_key
         self.tavily_api_key = tavily_api_key
+        self.session = session or _shared_session()
 
     def serper_search(self, query: str, num: int = 5) -> list[dict]:
         if not self.serper_api_key:
             return []
-        r = requests.post(
-            "https://google.serper.dev/search",
-            headers={"X-API-KEY": self.serper_api_key, "Content-Type": "application/json"},
-            json={"q": query, "num": num},
-            timeout=20,
-        )
-        r.raise_for_status()
-        data = r.json()
-        return data.get("organic", []) or []
+
+        def _fetch() -> list[dict]:
+            r = self.session.post(
+                "https://google.serper.dev/search",
+                headers={"X-API-KEY": self.serper_api_key, "Content-Type": "application/json"},
+                json={"q": query, "num": num},
+                timeout=20,
+            )
+            r.raise_for_status()
+            data = _response_json(r)
+            return data.get("organic", []) or []
+
+        return _cached_search("serper", query, num, _fetch)
 
     def tavily_search(self, query: str, max_results: int = 5) -> list[dict]:
         if not self.tavily_api_key:
             return []
-        r = requests.post(
-            "https://api.tavily.com/search",
-            json={"api_key": self.tavily_api_key, "query": query, "max_results": max_results},
-            timeout=20,
-        )
-        r.raise_for_status()
-        data = r.json()
-        return data.get("results", []) or []
 
+        def _fetch() -> list[dict]:
+            r = self.session.post(
+                "https://api.tavily.com/search",
+                json={"api_key": self.tavily_api_key, "query": query, "max_results": max_results},
+                timeout=20,
+            )
+            r.raise_for_status()
+            data = _response_json(r)
+            return data.get("results", []) or []
+
+        return _cached_search("tavily", query, max_results, _fetch)